@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Online Backup Script
+Copies devicelink.db and the chat shard databases with the SQLite online backup
+API so the service can keep serving writes while a backup runs, verifies every
+copy with integrity_check and keeps only the newest backups of each database.
+
+Each database is copied on its own, devicelink.db first and then the shards, so
+the copies in one backup set are not a single snapshot: a chat thread created
+or deleted while the set was being taken can have a route in devicelink.db and
+no thread in its shard copy, or the other way round. `check` compares the
+chat_thread_routes table of a devicelink.db backup with the threads in shard
+backups, so run it on the files you are about to restore.
+
+Usage:
+    python backup.py create
+    python backup.py list
+    python backup.py check <devicelink-backup> <chat-shard-backup>...
+    python backup.py restore <backup-file> [target-db]
+"""
+
+import glob
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Dict
+
+DATABASE_PATH = "./devicelink.db"
+CHAT_SHARD_DIR = "./chat_shards"
+BACKUP_DIR = "./backups"
+BACKUP_PREFIX = "devicelink-"
+PAGES_PER_STEP = 64
+STEP_SLEEP_SECONDS = 0.005
+KEEP_LAST = 7
+
+_backup_lock = threading.Lock()
+
+
+class BackupError(Exception):
+    pass
+
+
+def _integrity_check(path: str):
+    connection = sqlite3.connect(path)
+    try:
+        result = connection.execute("PRAGMA integrity_check").fetchone()[0]
+    finally:
+        connection.close()
+    if result != "ok":
+        raise BackupError(f"Integrity check failed for {path}: {result}")
+
+
+def _copy(source_path: str, target_path: str, pages: int, sleep: float):
+    # backup() copies `pages` pages per step and releases the source lock
+    # between steps. Its own `sleep` argument only applies when a step finds
+    # the source busy, so the pause that lets writers in between batches
+    # happens in the progress callback.
+    def pause(status, remaining, total):
+        if remaining and sleep:
+            time.sleep(sleep)
+
+    source = sqlite3.connect(source_path)
+    target = sqlite3.connect(target_path)
+    try:
+        source.backup(target, pages=pages, progress=pause)
+    finally:
+        target.close()
+        source.close()
+
+
+def default_targets(database_path: str = DATABASE_PATH, shard_dir: str = CHAT_SHARD_DIR):
+    """The main database plus every chat shard file, each with its own backup prefix."""
+    targets = [{"database_path": database_path, "prefix": BACKUP_PREFIX}]
+    for shard_path in sorted(glob.glob(os.path.join(shard_dir, "chat-*.db"))):
+        shard_name = os.path.splitext(os.path.basename(shard_path))[0]
+        targets.append({"database_path": shard_path, "prefix": f"{shard_name}-"})
+    return targets
+
+
+def _backup_prefix(name: str) -> str:
+    return re.sub(r"\d{8}T\d+Z\.db$", "", name)
+
+
+def list_backups(backup_dir: str = BACKUP_DIR, prefix: str = None):
+    if not os.path.isdir(backup_dir):
+        return []
+    backups = []
+    for name in sorted(os.listdir(backup_dir), reverse=True):
+        if not name.endswith(".db") or (prefix is not None and _backup_prefix(name) != prefix):
+            continue
+        path = os.path.join(backup_dir, name)
+        backups.append({
+            "name": name,
+            "path": path,
+            "size_bytes": os.path.getsize(path),
+            "created_at": datetime.utcfromtimestamp(os.path.getmtime(path)).isoformat(),
+        })
+    return backups
+
+
+def rotate_backups(backup_dir: str = BACKUP_DIR, keep_last: int = KEEP_LAST, prefix: str = BACKUP_PREFIX):
+    removed = []
+    for backup in list_backups(backup_dir, prefix)[keep_last:]:
+        try:
+            os.remove(backup["path"])
+        except FileNotFoundError:
+            # A manual backup in another worker rotated it out first.
+            continue
+        removed.append(backup["name"])
+    return removed
+
+
+def create_backup(
+    database_path: str = DATABASE_PATH,
+    backup_dir: str = BACKUP_DIR,
+    pages: int = PAGES_PER_STEP,
+    sleep: float = STEP_SLEEP_SECONDS,
+    keep_last: int = KEEP_LAST,
+    prefix: str = BACKUP_PREFIX,
+):
+    with _backup_lock:
+        os.makedirs(backup_dir, exist_ok=True)
+        name = f"{prefix}{datetime.utcnow().strftime('%Y%m%dT%H%M%S%fZ')}.db"
+        final_path = os.path.join(backup_dir, name)
+        partial_path = final_path + ".partial"
+
+        started = time.perf_counter()
+        try:
+            _copy(database_path, partial_path, pages, sleep)
+            _integrity_check(partial_path)
+        except Exception:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            raise
+        os.replace(partial_path, final_path)
+
+        return {
+            "name": name,
+            "path": final_path,
+            "size_bytes": os.path.getsize(final_path),
+            "duration_seconds": round(time.perf_counter() - started, 3),
+            "rotated": rotate_backups(backup_dir, keep_last, prefix),
+        }
+
+
+def restore_backup(backup_path: str, database_path: str = DATABASE_PATH):
+    if not os.path.exists(backup_path):
+        raise BackupError(f"Backup not found: {backup_path}")
+    _integrity_check(backup_path)
+    target_dir = os.path.dirname(os.path.abspath(database_path))
+    os.makedirs(target_dir, exist_ok=True)
+    _copy(backup_path, database_path, -1, 0)
+    _integrity_check(database_path)
+
+
+def _shard_index(path: str):
+    match = re.match(r"chat-(\d+)", os.path.basename(path))
+    return int(match.group(1)) if match else None
+
+
+def check_backup_set(main_backup: str, shard_backups) -> Dict[int, Dict]:
+    """Compare the chat_thread_routes of a devicelink.db backup with shard backups.
+
+    Returns, per shard, the threads routed to it that its copy doesn't have
+    (`missing_threads`) and the threads in its copy without a route
+    (`unrouted_threads`). Both are empty for a consistent set.
+    """
+    connection = sqlite3.connect(main_backup)
+    try:
+        routes: Dict[int, set] = {}
+        for thread_id, shard in connection.execute("SELECT id, shard FROM chat_thread_routes"):
+            routes.setdefault(shard, set()).add(thread_id)
+    finally:
+        connection.close()
+
+    report = {}
+    for shard_backup in shard_backups:
+        shard = _shard_index(shard_backup)
+        if shard is None:
+            raise BackupError(f"Not a chat shard backup: {shard_backup}")
+        connection = sqlite3.connect(shard_backup)
+        try:
+            threads = {row[0] for row in connection.execute("SELECT id FROM chat_threads")}
+        finally:
+            connection.close()
+        routed = routes.get(shard, set())
+        report[shard] = {
+            "missing_threads": sorted(routed - threads),
+            "unrouted_threads": sorted(threads - routed),
+        }
+    return report
+
+
+def create_backup_set(targets=None) -> Dict:
+    """Back up every target; the daily `backup_databases` maintenance job runs this."""
+    results = [create_backup(**target) for target in (targets if targets is not None else default_targets())]
+    return {
+        "backups": [result["name"] for result in results],
+        "size_bytes": sum(result["size_bytes"] for result in results),
+        "rotated": sum(len(result["rotated"]) for result in results),
+    }
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] not in ("create", "list", "check", "restore"):
+        print(__doc__)
+        sys.exit(1)
+
+    command = sys.argv[1]
+    if command == "create":
+        for target in default_targets():
+            result = create_backup(**target)
+            print(f"✓ Backup written to {result['path']} ({result['size_bytes']} bytes, {result['duration_seconds']}s)")
+            for name in result["rotated"]:
+                print(f"  rotated out {name}")
+    elif command == "list":
+        for backup in list_backups():
+            print(f"  {backup['name']}  {backup['size_bytes']} bytes  {backup['created_at']}")
+    elif command == "check":
+        if len(sys.argv) < 4:
+            print("✗ Usage: python backup.py check <devicelink-backup> <chat-shard-backup>...")
+            sys.exit(1)
+        try:
+            report = check_backup_set(sys.argv[2], sys.argv[3:])
+        except (BackupError, sqlite3.Error) as exc:
+            print(f"✗ {exc}")
+            sys.exit(1)
+        consistent = True
+        for shard, result in sorted(report.items()):
+            missing, unrouted = result["missing_threads"], result["unrouted_threads"]
+            if missing or unrouted:
+                consistent = False
+                print(f"✗ shard {shard}: {len(missing)} routed threads missing {missing[:10]}, "
+                      f"{len(unrouted)} threads without a route {unrouted[:10]}")
+            else:
+                print(f"✓ shard {shard}: routes and threads match")
+        sys.exit(0 if consistent else 1)
+    else:
+        if len(sys.argv) < 3:
+            print("✗ Usage: python backup.py restore <backup-file> [target-db]")
+            sys.exit(1)
+        target = sys.argv[3] if len(sys.argv) > 3 else DATABASE_PATH
+        try:
+            restore_backup(sys.argv[2], target)
+        except BackupError as exc:
+            print(f"✗ {exc}")
+            sys.exit(1)
+        print(f"✓ Restored {sys.argv[2]} into {target}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Chat Cold Storage Benchmark
+Fills a throwaway chat shard with read, inactive threads, compacts them into
+chat_cold_threads the way the maintenance job does (including its incremental
+vacuum) and reports how much the database file, the chat_messages table and
+its indexes shrink. A second thread keeps sending messages meanwhile to show
+how long compaction makes senders wait. Also times get_chat_messages for a hot
+thread, a cold thread read from disk and a cold thread served from the LRU.
+
+Usage:
+    python bench_chat_cold_storage.py [threads] [messages-per-thread]
+"""
+
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+WORDS = (
+    "hi thanks is the laptop still available can pick up tomorrow evening works for me "
+    "great charger included battery holds well see you at the library entrance sounds good"
+).split()
+
+
+def _load_app(workdir):
+    os.chdir(workdir)
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    import chat_shards
+    import main as app_main
+
+    app_main.rate_limiter.enabled = False
+    app_main.chat_store = chat_shards.ChatShardStore(app_main.ChatBase.metadata, shard_count=1, directory="shards")
+    return app_main
+
+
+def _seed(app_main, threads, messages_per_thread):
+    db = app_main.SessionLocal()
+    db.add_all([app_main.User(username="owner", password="x"), app_main.User(username="buyer", password="x")])
+    db.add_all(app_main.Listing(title=f"Device {i}", owner="owner", status="COMPLETED", approved=True) for i in range(threads))
+    db.commit()
+    routes = []
+    for listing in db.query(app_main.Listing).order_by(app_main.Listing.id).all():
+        route = app_main.ChatThreadRoute(listing_id=listing.id, owner_username="owner", participant_username="buyer", shard=0)
+        db.add(route)
+        routes.append(route)
+    db.commit()
+    thread_ids = [route.id for route in routes]
+    listing_ids = [route.listing_id for route in routes]
+    db.close()
+
+    random.seed(7)
+    long_ago = datetime.utcnow() - timedelta(days=90)
+    chat_db = app_main.chat_store.session(0)
+    for thread_id, listing_id in zip(thread_ids, listing_ids):
+        chat_db.add(app_main.ChatThread(
+            id=thread_id, listing_id=listing_id, owner_username="owner",
+            participant_username="buyer", created_at=long_ago, updated_at=long_ago,
+        ))
+        last_id = 0
+        for n in range(messages_per_thread):
+            message = app_main.ChatMessage(
+                id=app_main.chat_store.next_message_id(chat_db, 0),
+                thread_id=thread_id,
+                sender_username="buyer" if n % 2 else "owner",
+                content=" ".join(random.choices(WORDS, k=random.randint(3, 25))),
+                created_at=long_ago + timedelta(minutes=n),
+            )
+            chat_db.add(message)
+            chat_db.flush()
+            app_main.chat_search.index_message(chat_db, message)
+            last_id = message.id
+        for username in ("owner", "buyer"):
+            chat_db.add(app_main.ChatReadState(thread_id=thread_id, username=username, last_read_message_id=last_id))
+        chat_db.commit()
+    # The ORM stamps updated_at on flush, so age the threads afterwards.
+    chat_db.query(app_main.ChatThread).update({app_main.ChatThread.updated_at: long_ago})
+    chat_db.commit()
+    chat_db.close()
+    return thread_ids
+
+
+def _sizes(engine, path):
+    with engine.connect() as connection:
+        # No VACUUM: report what the compaction job itself leaves on disk.
+        connection.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+        free_pages = connection.exec_driver_sql("PRAGMA freelist_count").scalar()
+        page_size = connection.exec_driver_sql("PRAGMA page_size").scalar()
+        by_name = dict(connection.exec_driver_sql("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name").fetchall())
+        objects = connection.exec_driver_sql("SELECT name, type, tbl_name FROM sqlite_master").fetchall()
+    index_bytes = sum(
+        by_name.get(name, 0) for name, kind, table in objects if kind == "index" and table == "chat_messages"
+    )
+    return {
+        "file": os.path.getsize(path),
+        "free pages": free_pages * page_size,
+        "chat_messages": by_name.get("chat_messages", 0),
+        "chat_messages indexes": index_bytes,
+        "chat_cold_threads": by_name.get("chat_cold_threads", 0),
+        "fts": sum(size for name, size in by_name.items() if name.startswith("chat_messages_fts")),
+    }
+
+
+def _time(label, call, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        call()
+    print(f"  {label:<34} {(time.perf_counter() - started) / repeat * 1000:8.3f} ms")
+
+
+def _keep_sending(app_main, thread_id, stop, waits):
+    while not stop.is_set():
+        started = time.perf_counter()
+        app_main.send_chat_message(
+            thread_id, "buyer", app_main.ChatMessageCreate(sender_username="buyer", content="still there?")
+        )
+        waits.append(time.perf_counter() - started)
+        time.sleep(0.005)
+
+
+def main():
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    messages_per_thread = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+    workdir = tempfile.mkdtemp(prefix="devicelink-cold-")
+    app_main = _load_app(workdir)
+    import chat_cold_storage
+
+    print("=" * 50)
+    print("DeviceLink Chat Cold Storage Benchmark")
+    print("=" * 50)
+    print(f"  {threads} threads x {messages_per_thread} messages\n")
+
+    thread_ids = _seed(app_main, threads, messages_per_thread)
+    shard_engine = app_main.chat_store.engines[0]
+    hot_thread, busy_thread = thread_ids[0], thread_ids[-1]
+
+    shard_path = app_main.chat_store.path(0)
+    before = _sizes(shard_engine, shard_path)
+    # The sender's thread has unread messages, so it stays hot.
+    stop, waits = threading.Event(), []
+    sender = threading.Thread(target=_keep_sending, args=(app_main, busy_thread, stop, waits))
+    app_main.send_chat_message(
+        busy_thread, "buyer", app_main.ChatMessageCreate(sender_username="buyer", content="anyone?")
+    )
+    sender.start()
+    started = time.perf_counter()
+    metrics = chat_cold_storage.compact_inactive_threads(shard_engine)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    sender.join()
+    after = _sizes(shard_engine, shard_path)
+
+    print(f"  compacted {metrics['threads_compacted']} threads / {metrics['messages_compacted']} messages "
+          f"in {elapsed:.2f}s ({metrics['chunks']} transactions), {metrics['raw_bytes']} -> "
+          f"{metrics['stored_bytes']} bytes packed, {metrics['pages_released']} free pages released")
+    print(f"  {len(waits)} messages sent meanwhile, slowest {max(waits, default=0) * 1000:.1f} ms\n")
+    print(f"  {'bytes':<24} {'before':>12} {'after':>12} {'change':>8}")
+    for key in before:
+        if before[key]:
+            change = f"{(after[key] - before[key]) / before[key] * 100:+.0f}%"
+        else:
+            change = "new" if after[key] else "-"
+        print(f"  {key:<24} {before[key]:>12} {after[key]:>12} {change:>8}")
+
+    # Bring one thread back with a new message so hot and cold reads can be compared.
+    app_main.send_chat_message(
+        hot_thread, "buyer", app_main.ChatMessageCreate(sender_username="buyer", content="still there?")
+    )
+    cold_threads = thread_ids[1:-1]
+    print()
+    _time("get_chat_messages hot", lambda: app_main.get_chat_messages(hot_thread, "owner"), 200)
+    chat_cold_storage.cold_cache.max_threads = 0
+    _time("get_chat_messages cold (no cache)", lambda: app_main.get_chat_messages(random.choice(cold_threads), "owner"), 200)
+    chat_cold_storage.cold_cache.max_threads = chat_cold_storage.CACHE_THREADS
+    app_main.get_chat_messages(cold_threads[0], "owner")
+    _time("get_chat_messages cold (cached)", lambda: app_main.get_chat_messages(cold_threads[0], "owner"), 200)
+    _time("poll cold thread with after_id", lambda: app_main.get_chat_messages(cold_threads[1], "owner", after_id=2 ** 62), 200)
+
+    print(f"\n  scratch files left in {workdir}")
+
+
+if __name__ == "__main__":
+    main()
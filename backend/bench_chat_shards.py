@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Chat Shard Benchmark
+Sends chat messages through send_chat_message from several writer processes
+(the way multiple uvicorn workers would) and reports messages per second for
+different shard counts. Runs against a throwaway database in a temporary
+directory. Sharding only pays off once writers spend their time waiting on
+SQLite's write lock, so run it on a machine with several cores.
+
+Usage:
+    python bench_chat_shards.py [messages-per-writer] [writers]
+"""
+
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+SHARD_COUNTS = (1, 2, 4, 8)
+THREADS = 64
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _load_app(workdir, shard_count):
+    os.chdir(workdir)
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    import chat_shards
+    import main as app_main
+
+    app_main.rate_limiter.enabled = False
+    app_main.chat_store = chat_shards.ChatShardStore(
+        app_main.ChatBase.metadata, shard_count=shard_count, directory=f"shards-{shard_count}"
+    )
+    return app_main
+
+
+def _init_writer(workdir, shard_count, threads):
+    global _app
+    _app = _load_app(workdir, shard_count)
+    # Each shard has its own engine, and SQLAlchemy caches compiled statements
+    # per engine, so send one message on every shard before the clock starts.
+    warmed = set()
+    for offset, thread in enumerate(threads):
+        shard = _app.chat_store.shard_for(thread["id"])
+        if shard not in warmed:
+            _write([thread], 1, offset)
+            warmed.add(shard)
+
+
+def _write(threads, count, offset):
+    for n in range(count):
+        thread = threads[(offset + n) % len(threads)]
+        sender = thread["participant_username"]
+        _app.send_chat_message(
+            thread["id"], sender, _app.ChatMessageCreate(sender_username=sender, content=f"message {n}")
+        )
+    return count
+
+
+def _seed(app_main):
+    db = app_main.SessionLocal()
+    db.add(app_main.User(username="owner", password="x"))
+    for i in range(THREADS):
+        db.add(app_main.User(username=f"buyer{i}", password="x"))
+        db.add(app_main.Listing(title=f"Device {i}", owner="owner", status="ACTIVE", approved=True))
+    db.commit()
+    listing_ids = [l.id for l in db.query(app_main.Listing).order_by(app_main.Listing.id).all()]
+    db.close()
+    return listing_ids
+
+
+def main():
+    messages_per_writer = int(sys.argv[1]) if len(sys.argv) > 1 else 250
+    writers = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    workdir = tempfile.mkdtemp(prefix="devicelink-bench-")
+
+    print("=" * 50)
+    print("DeviceLink Chat Shard Benchmark")
+    print("=" * 50)
+    print(f"  {writers} writer processes x {messages_per_writer} messages over {THREADS} threads")
+    print(f"  {os.cpu_count()} CPU(s)\n")
+
+    listing_ids = None
+    baseline = None
+    context = multiprocessing.get_context("spawn")
+    for shard_count in SHARD_COUNTS:
+        app_main = _load_app(workdir, shard_count)
+        if listing_ids is None:
+            listing_ids = _seed(app_main)
+        db = app_main.SessionLocal()
+        db.query(app_main.ChatThreadRoute).delete()
+        db.commit()
+        db.close()
+        threads = [
+            app_main.create_or_get_chat_thread(app_main.ChatThreadCreate(listing_id=listing_id, username=f"buyer{i}"))
+            for i, listing_id in enumerate(listing_ids)
+        ]
+
+        with ProcessPoolExecutor(
+            max_workers=writers, mp_context=context, initializer=_init_writer,
+            initargs=(workdir, shard_count, threads),
+        ) as pool:
+            # Start every worker (the initializer warms it up) so process start-up is not timed.
+            list(pool.map(_write, [threads] * writers, [1] * writers, range(writers)))
+            started = time.perf_counter()
+            sent = sum(pool.map(
+                _write,
+                [threads] * writers,
+                [messages_per_writer] * writers,
+                [w * messages_per_writer for w in range(writers)],
+            ))
+            elapsed = time.perf_counter() - started
+
+        throughput = sent / elapsed
+        baseline = baseline or throughput
+        print(f"  {shard_count} shard(s): {throughput:8.0f} messages/s  ({throughput / baseline:.2f}x)")
+
+    print(f"\n  scratch files left in {workdir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Rate Limiter Benchmark
+Measures the per-request cost of the in-memory rate limiter: the bare bucket
+check with a large number of distinct clients (so dict growth and idle-bucket
+sweeps are included), and whole requests sent straight into a FastAPI app over
+ASGI, to a route with the limiter dependency and to the same route without it.
+The difference between the two is what the limiter adds to a real request.
+
+Usage:
+    python bench_rate_limit.py [requests] [distinct-clients]
+"""
+
+import asyncio
+import random
+import sys
+import time
+
+from fastapi import Depends, FastAPI
+
+from rate_limit import ENDPOINT_LIMITS, InMemoryBackend, RateLimit, RateLimiter
+
+
+def _report(label, seconds, count):
+    print(f"  {label:<32} {seconds / count * 1e6:8.3f} µs/request  ({count} requests)")
+
+
+def _app(limiter):
+    app = FastAPI()
+
+    @app.get("/plain")
+    def plain():
+        return {"ok": True}
+
+    @app.get("/limited", dependencies=[Depends(limiter.dependency("browse"))])
+    def limited():
+        return {"ok": True}
+
+    return app
+
+
+async def _request(app, path, address, statuses):
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"",
+        "root_path": "", "headers": [(b"host", b"bench")], "client": (address, 50000),
+        "server": ("bench", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            statuses[message["status"]] = statuses.get(message["status"], 0) + 1
+
+    await app(scope, receive, send)
+
+
+async def _time_requests(app, addresses, rounds=5):
+    # Alternate the two routes so drift affects both equally.
+    totals = {"/plain": 0.0, "/limited": 0.0}
+    statuses = {"/plain": {}, "/limited": {}}
+    chunk = len(addresses) // rounds
+    for start in range(0, chunk * rounds, chunk):
+        for path in totals:
+            started = time.perf_counter()
+            for address in addresses[start:start + chunk]:
+                await _request(app, path, address, statuses[path])
+            totals[path] += time.perf_counter() - started
+    return totals, statuses
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    clients = int(sys.argv[2]) if len(sys.argv) > 2 else 50_000
+    addresses = [f"10.{i // 65536}.{i // 256 % 256}.{i % 256}" for i in range(clients)]
+    order = [random.choice(addresses) for _ in range(requests)]
+
+    print("=" * 50)
+    print("DeviceLink Rate Limiter Benchmark")
+    print("=" * 50)
+
+    backend = InMemoryBackend(sweep_interval=0.05)
+    limit = ENDPOINT_LIMITS["browse"]
+    keys = [f"browse:ip:{address}" for address in order]
+    started = time.perf_counter()
+    for key in keys:
+        backend.acquire(key, limit)
+    _report("backend.acquire", time.perf_counter() - started, requests)
+
+    # A tight limit so the 429 path is part of the app timing too.
+    limiter = RateLimiter(limits={"browse": RateLimit(rate=1, capacity=3)}, backend=InMemoryBackend(sweep_interval=0.05))
+    app = _app(limiter)
+    app_order = order[:min(requests, 20_000)]
+    asyncio.run(_time_requests(app, app_order[:1000]))
+    totals, statuses = asyncio.run(_time_requests(app, app_order))
+    _report("app request without limiter", totals["/plain"], len(app_order))
+    _report("app request with limiter", totals["/limited"], len(app_order))
+    _report("limiter overhead", totals["/limited"] - totals["/plain"], len(app_order))
+
+    print(f"\n  live buckets: {len(backend)} of {clients} clients, limited route responses: {statuses['/limited']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Saved Search Index Benchmark
+Measures SavedSearchIndex.match() per approved listing with a large number of
+saved searches, for a realistic mix of keyword and facet-only searches and for
+the worst case where every search filters on the same category, condition and
+quantity range. The target is well under a millisecond per listing whenever a
+listing matches few searches; when it matches many, the time grows with the
+number of matches (each one becomes an inbox row anyway).
+
+Usage:
+    python bench_saved_search_index.py [saved-searches] [listings]
+"""
+
+import random
+import sys
+import time
+
+from saved_search_index import SavedSearchEntry, SavedSearchIndex, tokenize
+
+CATEGORIES = ["Laptop", "Phone", "Tablet", "Monitor", "Keyboard", "Mouse", "Printer", "Camera"]
+CONDITIONS = ["New", "Like New", "Good", "Fair"]
+WORDS = (
+    "dell hp lenovo apple samsung asus acer logitech canon sony thinkpad macbook ipad galaxy "
+    "pixel surface chromebook ultrabook gaming wireless mechanical usb charger dock stylus "
+    "retina oled curved ergonomic bluetooth touchscreen refurbished spare broken cracked"
+).split()
+# Model names and numbers give listings a long tail of rarer tokens, as real titles have.
+VOCABULARY = WORDS + [f"{brand}{number}" for brand in ("x", "t", "g", "s", "m") for number in range(1, 400)]
+WEIGHTS = [1 / (rank + 1) for rank in range(len(VOCABULARY))]
+
+
+def _random_search(search_id):
+    keywords = frozenset(random.sample(VOCABULARY, random.randint(1, 3)))
+    if random.random() < 0.05:
+        keywords = frozenset()
+    low = random.choice([None, 1, 2, 5])
+    return SavedSearchEntry(
+        id=search_id,
+        username=f"user{search_id % 5000}",
+        keywords=keywords,
+        category=random.choice(CATEGORIES) if random.random() < 0.8 else None,
+        condition=random.choice(CONDITIONS) if random.random() < 0.5 else None,
+        min_quantity=low,
+        max_quantity=None if low is None else low + random.choice([0, 5, 20]),
+    )
+
+
+def _random_listing():
+    return (
+        " ".join(random.choices(VOCABULARY, WEIGHTS, k=4)),
+        " ".join(random.choices(VOCABULARY, WEIGHTS, k=25)),
+        random.choice(CATEGORIES),
+        random.choice(CONDITIONS),
+        random.randint(1, 30),
+    )
+
+
+def _time(label, index, listings):
+    matched = 0
+    started = time.perf_counter()
+    for listing in listings:
+        matched += len(index.match(*listing))
+    elapsed = time.perf_counter() - started
+    print(f"  {label:<40} {elapsed / len(listings) * 1000:8.4f} ms/listing  "
+          f"({matched / len(listings):.0f} matches/listing)")
+
+
+def main():
+    searches = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    listing_count = int(sys.argv[2]) if len(sys.argv) > 2 else 2_000
+    random.seed(7)
+
+    print("=" * 50)
+    print("DeviceLink Saved Search Index Benchmark")
+    print("=" * 50)
+    print(f"  {searches} saved searches\n")
+
+    entries = [_random_search(i) for i in range(searches)]
+    mixed = SavedSearchIndex()
+    mixed.rebuild(entries)
+    listings = [_random_listing() for _ in range(listing_count)]
+    _time("mixed searches", mixed, listings)
+    for listing in listings[:20]:
+        tokens = tokenize(listing[0]) | tokenize(listing[1])
+        expected = {entry.id for entry in entries if entry.matches(tokens, *listing[2:])}
+        assert {entry.id for entry in mixed.match(*listing)} == expected, "index disagrees with a full scan"
+
+    shared = SavedSearchIndex()
+    shared.rebuild(
+        SavedSearchEntry(
+            id=i, username=f"user{i % 5000}", keywords=frozenset(),
+            category="Laptop", condition="Good", min_quantity=2, max_quantity=4,
+        )
+        for i in range(searches)
+    )
+    _time("shared facets, other condition", shared, [("Dell laptop", "", "Laptop", "Fair", 3)] * listing_count)
+    _time("shared facets, quantity out of range", shared, [("Dell laptop", "", "Laptop", "Good", 10)] * listing_count)
+    _time("shared facets, all match", shared, [("Dell laptop", "", "Laptop", "Good", 3)] * 20)
+
+    # Keyword searches all posted under the same token: candidates are verified one by one.
+    keyword = SavedSearchIndex()
+    keyword.rebuild(
+        SavedSearchEntry(id=i, username=f"user{i % 5000}", keywords=frozenset(tokenize("thinkpad")), category="Laptop")
+        for i in range(searches)
+    )
+    _time("shared keyword, other category", keyword, [("Thinkpad", "", "Phone", "Good", 1)] * 20)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Change sequences for delta sync.
+
+Tracked models carry a `change_seq` column that is stamped from a per-database
+counter every time a session flushes an insert or update of that row, so a
+client can ask for "everything with change_seq greater than the last value I
+saw". Hard deletes of tracked rows can be recorded as tombstone rows stamped
+from the same counter.
+
+The counter is a hybrid clock: each allocation returns
+max(previous + 1, current time in microseconds). Within one database, values
+follow commit order because SQLite only lets one writer hold the counter at a
+time, so the committed counter value is an exact high-water mark. Values from
+different databases (the chat shards) are only comparable through the clock,
+so feeds spanning several databases hand out settled_mark() instead, which
+trails the clock by SETTLE_MICROSECONDS to cover transactions that had taken
+a value but not yet committed when the feed was read.
+"""
+
+import time
+from typing import Callable, Dict, Iterable, Optional
+
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+SEQUENCE_TABLE = "change_sequence"
+COLUMN = "change_seq"
+SETTLE_MICROSECONDS = 2_000_000
+
+_tracked = set()
+_tombstones: Dict[type, Callable] = {}
+
+
+def _now_microseconds() -> int:
+    return time.time_ns() // 1000
+
+
+def ensure_change_tracking(engine, tables: Iterable[str]):
+    """Create the counter table and add change_seq to tables created before it existed.
+
+    Existing rows are backfilled with their id, which keeps them distinct and
+    below anything the clock-based counter hands out.
+    """
+    with engine.begin() as connection:
+        connection.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {SEQUENCE_TABLE} ("
+            " id INTEGER PRIMARY KEY CHECK (id = 1),"
+            " value INTEGER NOT NULL)"
+        ))
+        connection.execute(text(f"INSERT OR IGNORE INTO {SEQUENCE_TABLE} (id, value) VALUES (1, 0)"))
+        for table in tables:
+            columns = {row[1] for row in connection.execute(text(f"PRAGMA table_info({table})"))}
+            if COLUMN not in columns:
+                connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {COLUMN} INTEGER NOT NULL DEFAULT 0"))
+                connection.execute(text(f"UPDATE {table} SET {COLUMN} = id"))
+                connection.execute(text(
+                    f"UPDATE {SEQUENCE_TABLE} SET value = MAX(value, (SELECT COALESCE(MAX(id), 0) FROM {table})) "
+                    "WHERE id = 1"
+                ))
+
+
+def next_change_seq(connection, count: int = 1) -> int:
+    """Reserve `count` consecutive values and return the last one."""
+    return connection.execute(
+        text(
+            f"UPDATE {SEQUENCE_TABLE} SET value = MAX(value + :count, :now + :count - 1) "
+            "WHERE id = 1 RETURNING value"
+        ),
+        {"count": count, "now": _now_microseconds()},
+    ).scalar()
+
+
+def current_change_seq(connection) -> int:
+    return connection.execute(text(f"SELECT value FROM {SEQUENCE_TABLE} WHERE id = 1")).scalar() or 0
+
+
+def settled_mark(since: Optional[int] = 0) -> int:
+    """High-water mark for feeds that read from more than one database."""
+    return max(since or 0, _now_microseconds() - SETTLE_MICROSECONDS)
+
+
+def track(model, tombstone: Optional[Callable] = None):
+    """Stamp change_seq on `model` rows; `tombstone(row, seq)` builds the row recorded on delete."""
+    _tracked.add(model)
+    if tombstone is not None:
+        _tombstones[model] = tombstone
+
+
+@event.listens_for(Session, "before_flush")
+def _stamp_changes(session, flush_context, instances):
+    changed = [obj for obj in session.new if type(obj) in _tracked]
+    changed.extend(
+        obj for obj in session.dirty
+        if type(obj) in _tracked and session.is_modified(obj, include_collections=False)
+    )
+    deleted = [obj for obj in session.deleted if type(obj) in _tombstones]
+    if not changed and not deleted:
+        return
+
+    last = next_change_seq(session.connection(), len(changed) + len(deleted))
+    seq = last - len(changed) - len(deleted)
+    for obj in changed:
+        seq += 1
+        setattr(obj, COLUMN, seq)
+    for obj in deleted:
+        seq += 1
+        session.add(_tombstones[type(obj)](obj, seq))
@@ -0,0 +1,315 @@
+"""
+Cold storage for inactive chat threads.
+
+Once a thread has had no activity for INACTIVE_DAYS and nobody has unread
+messages in it, compact_inactive_threads() packs all of its messages into a
+single chat_cold_threads row and deletes them from chat_messages, so the hot
+table and its indexes only hold conversations that are still going on.
+
+Each cold row holds two zlib blobs: `message_index`, a JSON list of
+[id, sender_username, created_at, offset, length] entries, and `payload`,
+the UTF-8 message bodies laid end to end at those offsets. `last_message_id`
+is kept in the clear so readers can tell whether a poll with `after_id` needs
+the blob at all. Decoded threads are kept in a small LRU (ColdThreadCache).
+
+The FTS index is contentless, so the tokens of cold messages stay searchable
+without a second copy of their text; search reads matching bodies from the
+cold row. Threads are packed COMPACT_BATCH_THREADS per write transaction so
+senders never wait long on the shard's lock.
+Sending a message to a cold thread moves its messages back into chat_messages
+first (rehydrate_thread). Compaction only deletes the message ids it packed,
+so a message that arrives mid-compaction simply stays hot; readers always
+merge the cold and hot parts.
+"""
+
+import json
+import threading
+import zlib
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+
+import maintenance
+
+COLD_TABLE = "chat_cold_threads"
+INACTIVE_DAYS = 30
+CACHE_THREADS = 256
+COMPRESSION_LEVEL = 9
+# Threads packed per write transaction. Compressing a thread takes a few
+# milliseconds, so a batch holds the shard's write lock briefly enough for
+# send_chat_message to get in between batches.
+COMPACT_BATCH_THREADS = 16
+
+
+def ensure_cold_storage_table(engine):
+    with engine.begin() as connection:
+        connection.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {COLD_TABLE} ("
+            " thread_id INTEGER PRIMARY KEY,"
+            " message_count INTEGER NOT NULL,"
+            " last_message_id INTEGER NOT NULL,"
+            " raw_bytes INTEGER NOT NULL,"
+            " message_index BLOB NOT NULL,"
+            " payload BLOB NOT NULL,"
+            " compacted_at DATETIME NOT NULL)"
+        ))
+
+
+def _iso(created_at: Optional[str]) -> Optional[str]:
+    # Raw SQL hands back SQLite's "YYYY-MM-DD HH:MM:SS.ffffff"; the API uses isoformat().
+    return created_at.replace(" ", "T") if isinstance(created_at, str) else created_at
+
+
+def pack_messages(rows) -> Dict:
+    """Pack (id, sender_username, content, created_at) rows, ordered by id, into one cold row."""
+    index = []
+    bodies = []
+    offset = 0
+    for message_id, sender_username, content, created_at in rows:
+        body = (content or "").encode("utf-8")
+        index.append([message_id, sender_username, created_at, offset, len(body)])
+        bodies.append(body)
+        offset += len(body)
+    index_json = json.dumps(index, separators=(",", ":")).encode("utf-8")
+    return {
+        "message_count": len(index),
+        "last_message_id": index[-1][0] if index else 0,
+        "raw_bytes": offset + len(index_json),
+        "message_index": zlib.compress(index_json, COMPRESSION_LEVEL),
+        "payload": zlib.compress(b"".join(bodies), COMPRESSION_LEVEL),
+    }
+
+
+def _unpack_rows(message_index: bytes, payload: bytes):
+    bodies = zlib.decompress(payload)
+    return [
+        (message_id, sender_username, bodies[offset:offset + length].decode("utf-8"), created_at)
+        for message_id, sender_username, created_at, offset, length in json.loads(zlib.decompress(message_index))
+    ]
+
+
+def unpack_messages(thread_id: int, message_index: bytes, payload: bytes) -> List[Dict]:
+    return [
+        {
+            "id": message_id,
+            "thread_id": thread_id,
+            "sender_username": sender_username,
+            "content": content,
+            "created_at": _iso(created_at),
+        }
+        for message_id, sender_username, content, created_at in _unpack_rows(message_index, payload)
+    ]
+
+
+class ColdThreadCache:
+    """LRU of decoded cold threads, keyed by thread id and checked against last_message_id.
+
+    Other workers can rehydrate and re-compact a thread, so an entry is only
+    used while the cold row still ends at the same message id.
+    """
+
+    def __init__(self, max_threads: int = CACHE_THREADS):
+        self.max_threads = max_threads
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, thread_id: int, last_message_id: int) -> Optional[List[Dict]]:
+        with self._lock:
+            entry = self._entries.get(thread_id)
+            if entry is None or entry[0] != last_message_id:
+                return None
+            self._entries.move_to_end(thread_id)
+            return entry[1]
+
+    def put(self, thread_id: int, last_message_id: int, messages: List[Dict]):
+        with self._lock:
+            self._entries[thread_id] = (last_message_id, messages)
+            self._entries.move_to_end(thread_id)
+            while len(self._entries) > self.max_threads:
+                self._entries.popitem(last=False)
+
+    def discard(self, thread_id: int):
+        with self._lock:
+            self._entries.pop(thread_id, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+cold_cache = ColdThreadCache()
+
+
+def cold_last_message_id(connection, thread_id: int) -> Optional[int]:
+    """The last message id packed for `thread_id`, or None when the thread isn't cold."""
+    return connection.execute(
+        text(f"SELECT last_message_id FROM {COLD_TABLE} WHERE thread_id = :thread_id"),
+        {"thread_id": thread_id},
+    ).scalar()
+
+
+def load_cold_messages(connection, thread_id: int, last_message_id: int) -> List[Dict]:
+    messages = cold_cache.get(thread_id, last_message_id)
+    if messages is not None:
+        return messages
+    row = connection.execute(
+        text(f"SELECT last_message_id, message_index, payload FROM {COLD_TABLE} WHERE thread_id = :thread_id"),
+        {"thread_id": thread_id},
+    ).fetchone()
+    if row is None:
+        return []
+    messages = unpack_messages(thread_id, row[1], row[2])
+    cold_cache.put(thread_id, row[0], messages)
+    return messages
+
+
+def _has_cold_table(connection) -> bool:
+    return connection.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": COLD_TABLE}
+    ).first() is not None
+
+
+def cold_messages(connection, thread_ids: List[int]) -> List[tuple]:
+    """(id, thread_id, content) of every message packed for `thread_ids`, e.g. to drop their FTS rows."""
+    if not thread_ids or not _has_cold_table(connection):
+        return []
+    placeholders, params = maintenance.in_clause(thread_ids)
+    rows = connection.execute(
+        text(f"SELECT thread_id, message_index, payload FROM {COLD_TABLE} WHERE thread_id IN ({placeholders})"), params
+    ).fetchall()
+    return [
+        (message_id, row[0], content)
+        for row in rows
+        for message_id, _, content, _ in _unpack_rows(row[1], row[2])
+    ]
+
+
+def copy_cold_threads(source, target, thread_ids: List[int]) -> List[tuple]:
+    """Copy the cold rows of `thread_ids` between chat databases.
+
+    Returns the copied messages as (id, thread_id, sender_username, content,
+    created_at) so the caller can index them and reserve their ids.
+    """
+    if not thread_ids or not _has_cold_table(source):
+        return []
+    placeholders, params = maintenance.in_clause(thread_ids)
+    rows = source.execute(text(
+        "SELECT thread_id, message_count, last_message_id, raw_bytes, message_index, payload, compacted_at "
+        f"FROM {COLD_TABLE} WHERE thread_id IN ({placeholders})"
+    ), params).fetchall()
+    if not rows:
+        return []
+    target.execute(text(
+        f"INSERT OR REPLACE INTO {COLD_TABLE} "
+        "(thread_id, message_count, last_message_id, raw_bytes, message_index, payload, compacted_at) "
+        "VALUES (:thread_id, :message_count, :last_message_id, :raw_bytes, :message_index, :payload, :compacted_at)"
+    ), [dict(row._mapping) for row in rows])
+    return [
+        (message_id, row[0], sender_username, content, created_at)
+        for row in rows
+        for message_id, sender_username, content, created_at in _unpack_rows(row[4], row[5])
+    ]
+
+
+def compact_thread(connection, thread_id: int) -> Dict:
+    """Pack every message of `thread_id` (hot and any earlier cold ones) into its cold row."""
+    rows = []
+    existing = connection.execute(
+        text(f"SELECT message_index, payload FROM {COLD_TABLE} WHERE thread_id = :thread_id"),
+        {"thread_id": thread_id},
+    ).fetchone()
+    if existing is not None:
+        rows.extend(_unpack_rows(existing[0], existing[1]))
+    rows.extend(connection.execute(
+        text(
+            "SELECT id, sender_username, content, created_at FROM chat_messages "
+            "WHERE thread_id = :thread_id ORDER BY id"
+        ),
+        {"thread_id": thread_id},
+    ).fetchall())
+    if not rows:
+        return {"messages": 0, "raw_bytes": 0, "stored_bytes": 0}
+    rows.sort(key=lambda row: row[0])
+
+    packed = pack_messages(rows)
+    connection.execute(
+        text(
+            f"INSERT OR REPLACE INTO {COLD_TABLE} "
+            "(thread_id, message_count, last_message_id, raw_bytes, message_index, payload, compacted_at) "
+            "VALUES (:thread_id, :message_count, :last_message_id, :raw_bytes, :message_index, :payload, :now)"
+        ),
+        dict(packed, thread_id=thread_id, now=datetime.utcnow().isoformat(sep=" ")),
+    )
+    # Only the ids just packed: anything sent in the meantime stays hot.
+    connection.execute(
+        text("DELETE FROM chat_messages WHERE thread_id = :thread_id AND id <= :last_message_id"),
+        {"thread_id": thread_id, "last_message_id": packed["last_message_id"]},
+    )
+    cold_cache.discard(thread_id)
+    return {
+        "messages": packed["message_count"],
+        "raw_bytes": packed["raw_bytes"],
+        "stored_bytes": len(packed["message_index"]) + len(packed["payload"]),
+    }
+
+
+def rehydrate_thread(connection, thread_id: int) -> int:
+    """Move a cold thread's messages back into chat_messages. Returns how many were restored."""
+    row = connection.execute(
+        text(f"SELECT message_index, payload FROM {COLD_TABLE} WHERE thread_id = :thread_id"),
+        {"thread_id": thread_id},
+    ).fetchone()
+    if row is None:
+        return 0
+    rows = _unpack_rows(row[0], row[1])
+    if rows:
+        connection.execute(
+            text(
+                "INSERT OR IGNORE INTO chat_messages (id, thread_id, sender_username, content, created_at) "
+                "VALUES (:id, :thread_id, :sender, :content, :created_at)"
+            ),
+            [
+                {"id": message_id, "thread_id": thread_id, "sender": sender, "content": content, "created_at": created_at}
+                for message_id, sender, content, created_at in rows
+            ],
+        )
+    connection.execute(text(f"DELETE FROM {COLD_TABLE} WHERE thread_id = :thread_id"), {"thread_id": thread_id})
+    cold_cache.discard(thread_id)
+    return len(rows)
+
+
+def compact_inactive_threads(engine, inactive_days: int = INACTIVE_DAYS) -> Dict:
+    """Compact threads idle for `inactive_days` whose messages both participants have read."""
+    cutoff = datetime.utcnow() - timedelta(days=inactive_days)
+    metrics = {"threads_compacted": 0, "messages_compacted": 0, "raw_bytes": 0, "stored_bytes": 0}
+
+    def apply(connection, ids):
+        for thread_id in ids:
+            result = compact_thread(connection, thread_id)
+            metrics["messages_compacted"] += result["messages"]
+            metrics["raw_bytes"] += result["raw_bytes"]
+            metrics["stored_bytes"] += result["stored_bytes"]
+
+    threads, chunks = maintenance.chunked(
+        engine,
+        "SELECT t.id FROM chat_threads t "
+        "WHERE t.id > :after_id AND t.updated_at < :cutoff "
+        "AND EXISTS (SELECT 1 FROM chat_messages m WHERE m.thread_id = t.id) "
+        "AND NOT EXISTS ("
+        " SELECT 1 FROM chat_messages m"
+        " LEFT JOIN chat_read_states r ON r.thread_id = t.id AND r.username = CASE"
+        "  WHEN m.sender_username = t.owner_username THEN t.participant_username"
+        "  ELSE t.owner_username END"
+        " WHERE m.thread_id = t.id AND m.id > COALESCE(r.last_read_message_id, 0)"
+        ") ORDER BY t.id LIMIT :limit",
+        apply,
+        {"cutoff": cutoff.isoformat(sep=" ")},
+        chunk_size=COMPACT_BATCH_THREADS,
+    )
+    metrics["threads_compacted"] = threads
+    metrics["chunks"] = chunks
+    # Deleting the packed messages only puts their pages on the freelist; hand
+    # them back so the shard file actually shrinks.
+    metrics["pages_released"] = maintenance.incremental_vacuum(engine) if threads else 0
+    return metrics
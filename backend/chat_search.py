@@ -0,0 +1,288 @@
+import html
+import re
+import unicodedata
+from typing import Dict, List, Optional, Set
+
+from sqlalchemy import text
+
+import chat_cold_storage
+
+FTS_TABLE = "chat_messages_fts"
+BACKFILL_CHUNK_SIZE = 1000
+SNIPPET_TOKENS = 12
+ID_CHUNK_SIZE = 500
+# Placeholder markers that cannot appear in escaped text; swapped for <mark> tags after escaping.
+_HIGHLIGHT_START = "\x02"
+_HIGHLIGHT_END = "\x03"
+
+_QUERY_TERM = re.compile(r"\w+", re.UNICODE)
+_CONTENT_TOKEN = re.compile(r"[^\W_]+", re.UNICODE)
+
+
+def thread_key(thread_id: int) -> str:
+    return f"t{thread_id}"
+
+
+def _create_fts_table(connection, name: str):
+    connection.execute(text(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {name} USING fts5("
+        " content,"
+        " thread_key,"
+        " content = '',"
+        " tokenize = 'unicode61 remove_diacritics 2')"
+    ))
+
+
+def ensure_chat_search_tables(engine):
+    with engine.begin() as connection:
+        existing = connection.execute(
+            text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": FTS_TABLE}
+        ).scalar()
+        if existing is not None and "thread_key" not in existing:
+            # Shards from before thread-scoped search kept a full copy of every
+            # message body in the FTS table; rebuild it contentless from that copy.
+            connection.execute(text(f"ALTER TABLE {FTS_TABLE} RENAME TO {FTS_TABLE}_legacy"))
+            _create_fts_table(connection, FTS_TABLE)
+            connection.execute(text(
+                f"INSERT INTO {FTS_TABLE} (rowid, content, thread_key) "
+                f"SELECT rowid, content, 't' || thread_id FROM {FTS_TABLE}_legacy"
+            ))
+            connection.execute(text(f"DROP TABLE {FTS_TABLE}_legacy"))
+        else:
+            _create_fts_table(connection, FTS_TABLE)
+        connection.execute(text(
+            "CREATE TABLE IF NOT EXISTS chat_search_backfill ("
+            " id INTEGER PRIMARY KEY CHECK (id = 1),"
+            " last_message_id INTEGER NOT NULL)"
+        ))
+        connection.execute(text(
+            "INSERT OR IGNORE INTO chat_search_backfill (id, last_message_id) VALUES (1, 0)"
+        ))
+
+
+def index_message(db, message):
+    db.execute(
+        text(f"INSERT INTO {FTS_TABLE} (rowid, content, thread_key) VALUES (:id, :content, :thread_key)"),
+        {"id": message.id, "content": message.content, "thread_key": thread_key(message.thread_id)},
+    )
+
+
+def _indexed_ids(connection, ids: List[int]) -> Set[int]:
+    indexed = set()
+    for start in range(0, len(ids), ID_CHUNK_SIZE):
+        chunk = ids[start:start + ID_CHUNK_SIZE]
+        placeholders = ", ".join(f":id{i}" for i in range(len(chunk)))
+        indexed.update(row[0] for row in connection.execute(
+            text(f"SELECT rowid FROM {FTS_TABLE} WHERE rowid IN ({placeholders})"),
+            {f"id{i}": message_id for i, message_id in enumerate(chunk)},
+        ))
+    return indexed
+
+
+def index_messages(connection, rows) -> int:
+    """Index (id, thread_id, content) rows that aren't in the FTS table yet."""
+    indexed = _indexed_ids(connection, [row[0] for row in rows])
+    values = [
+        {"id": message_id, "content": content, "thread_key": thread_key(thread_id)}
+        for message_id, thread_id, content in rows
+        if message_id not in indexed
+    ]
+    if values:
+        connection.execute(
+            text(f"INSERT INTO {FTS_TABLE} (rowid, content, thread_key) VALUES (:id, :content, :thread_key)"),
+            values,
+        )
+    return len(values)
+
+
+def unindex_messages(connection, rows) -> int:
+    """Drop (id, thread_id, content) rows from the FTS table.
+
+    The table is contentless, so FTS5 needs the indexed values to find the
+    tokens to remove; rows that were never indexed are skipped, since deleting
+    them would corrupt the index.
+    """
+    indexed = _indexed_ids(connection, [row[0] for row in rows])
+    values = [
+        {"id": message_id, "content": content, "thread_key": thread_key(thread_id)}
+        for message_id, thread_id, content in rows
+        if message_id in indexed
+    ]
+    if values:
+        connection.execute(
+            text(
+                f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, content, thread_key) "
+                "VALUES ('delete', :id, :content, :thread_key)"
+            ),
+            values,
+        )
+    return len(values)
+
+
+def _query_terms(query: str) -> List[str]:
+    return _QUERY_TERM.findall(query)
+
+
+def build_match_expression(query: str) -> Optional[str]:
+    """Turn free text into an FTS5 expression: every word must match, the last one as a prefix."""
+    terms = _query_terms(query)
+    if not terms:
+        return None
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+def _fold(token: str) -> str:
+    # Roughly what the unicode61 tokenizer with remove_diacritics does.
+    decomposed = unicodedata.normalize("NFKD", token.casefold())
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def _snippet(content: str, terms: List[str]) -> str:
+    """Up to SNIPPET_TOKENS tokens of `content` around the first match, matches wrapped in markers.
+
+    The FTS table is contentless, so FTS5's snippet() has no text to work with.
+    """
+    tokens = list(_CONTENT_TOKEN.finditer(content or ""))
+    if not tokens:
+        return ""
+    folded = [_fold(term) for term in terms]
+
+    def matches(token) -> bool:
+        word = _fold(token.group())
+        return word in folded[:-1] or word.startswith(folded[-1])
+
+    hits = {i for i, token in enumerate(tokens) if matches(token)}
+    # Start one token before the first match, like FTS5's snippet() tends to.
+    first = max(0, min(min(hits, default=0) - 1, len(tokens) - SNIPPET_TOKENS))
+    window = tokens[first:first + SNIPPET_TOKENS]
+    parts = ["…" if first > 0 else content[:window[0].start()]]
+    position = window[0].start()
+    for index, token in enumerate(window, start=first):
+        parts.append(content[position:token.start()])
+        if index in hits:
+            parts.append(f"{_HIGHLIGHT_START}{token.group()}{_HIGHLIGHT_END}")
+        else:
+            parts.append(token.group())
+        position = token.end()
+    parts.append("…" if first + len(window) < len(tokens) else content[position:])
+    return "".join(parts)
+
+
+def _highlight(snippet: str) -> str:
+    escaped = html.escape(snippet or "")
+    return escaped.replace(_HIGHLIGHT_START, "<mark>").replace(_HIGHLIGHT_END, "</mark>")
+
+
+def _scoped_expression(thread_ids: List[int], terms: str) -> str:
+    keys = " OR ".join(f'"{thread_key(thread_id)}"' for thread_id in thread_ids)
+    return f"thread_key : ({keys}) AND content : ({terms})"
+
+
+def search_messages(chat_db, thread_ids: List[int], query: str, before_id: Optional[int], limit: int) -> List[Dict]:
+    """Newest-first matches among `thread_ids`, at most `limit` of them, older than `before_id`.
+
+    The thread scope is part of the MATCH expression, so FTS5 intersects the
+    threads' postings with the query terms instead of walking every matching
+    message in the shard. Hot messages are read back from chat_messages;
+    messages of cold threads come from their decoded cold rows.
+    """
+    expression = build_match_expression(query)
+    if expression is None or not thread_ids:
+        return []
+    terms = _query_terms(query)
+    before_id = before_id if before_id is not None else 2 ** 63 - 1
+
+    found = {}
+    for message_id, thread_id, sender_username, created_at, content in chat_db.execute(
+        text(
+            "SELECT m.id, m.thread_id, m.sender_username, m.created_at, m.content "
+            f"FROM {FTS_TABLE} f JOIN chat_messages m ON m.id = f.rowid "
+            f"WHERE {FTS_TABLE} MATCH :expression AND f.rowid < :before_id "
+            "ORDER BY f.rowid DESC LIMIT :limit"
+        ),
+        {"expression": _scoped_expression(thread_ids, expression), "before_id": before_id, "limit": limit},
+    ):
+        # Raw SQL hands back SQLite's "YYYY-MM-DD HH:MM:SS.ffffff"; the API uses isoformat().
+        created_at = created_at.replace(" ", "T") if isinstance(created_at, str) else created_at
+        found[message_id] = (thread_id, sender_username, created_at, content)
+
+    placeholders = ", ".join(f":thread{i}" for i in range(len(thread_ids)))
+    cold_threads = chat_db.execute(
+        text(
+            f"SELECT thread_id, last_message_id FROM {chat_cold_storage.COLD_TABLE} "
+            f"WHERE thread_id IN ({placeholders})"
+        ),
+        {f"thread{i}": thread_id for i, thread_id in enumerate(thread_ids)},
+    ).fetchall()
+    for thread_id, last_message_id in cold_threads:
+        ids = [row[0] for row in chat_db.execute(
+            text(
+                f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :expression "
+                "AND rowid < :before_id AND rowid <= :last_message_id ORDER BY rowid DESC LIMIT :limit"
+            ),
+            {
+                "expression": _scoped_expression([thread_id], expression),
+                "before_id": before_id,
+                "last_message_id": last_message_id,
+                "limit": limit,
+            },
+        )]
+        if not ids:
+            continue
+        cold = {m["id"]: m for m in chat_cold_storage.load_cold_messages(chat_db, thread_id, last_message_id)}
+        for message_id in ids:
+            message = cold.get(message_id)
+            if message is not None and message_id not in found:
+                found[message_id] = (thread_id, message["sender_username"], message["created_at"], message["content"])
+
+    return [
+        {
+            "message_id": message_id,
+            "thread_id": thread_id,
+            "sender_username": sender_username,
+            "created_at": created_at,
+            "snippet": _highlight(_snippet(content, terms)),
+        }
+        for message_id, (thread_id, sender_username, created_at, content) in sorted(found.items(), reverse=True)[:limit]
+    ]
+
+
+def backfill_chat_search(engine) -> Dict:
+    """Maintenance job: index chat messages that are not in the FTS table yet.
+
+    Walks chat_messages in id order from a persisted cursor, so after the first
+    full pass each run only looks at messages added since the previous one.
+    """
+    indexed = 0
+    chunks = 0
+    while True:
+        with engine.begin() as connection:
+            last_id = connection.execute(
+                text("SELECT last_message_id FROM chat_search_backfill WHERE id = 1")
+            ).scalar()
+            upper_id = connection.execute(
+                text(
+                    "SELECT MAX(id) FROM (SELECT id FROM chat_messages WHERE id > :last_id "
+                    "ORDER BY id LIMIT :limit)"
+                ),
+                {"last_id": last_id, "limit": BACKFILL_CHUNK_SIZE},
+            ).scalar()
+            if upper_id is None:
+                break
+            rows = connection.execute(
+                text(
+                    "SELECT id, thread_id, content FROM chat_messages "
+                    "WHERE id > :last_id AND id <= :upper_id ORDER BY id"
+                ),
+                {"last_id": last_id, "upper_id": upper_id},
+            ).fetchall()
+            indexed += index_messages(connection, rows)
+            chunks += 1
+            connection.execute(
+                text("UPDATE chat_search_backfill SET last_message_id = :upper_id WHERE id = 1"),
+                {"upper_id": upper_id},
+            )
+    return {"messages_indexed": indexed, "chunks": chunks}
+
@@ -0,0 +1,341 @@
+import os
+from datetime import datetime
+from typing import Dict, List
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import sessionmaker
+
+import change_feed
+import chat_cold_storage
+import chat_search
+import maintenance
+
+CHAT_SHARD_COUNT = 4
+CHAT_SHARD_DIR = "./chat_shards"
+# Message ids are `sequence * MESSAGE_ID_STRIDE + shard`, so every shard can hand
+# out ids on its own without two shards ever producing the same one.
+MESSAGE_ID_STRIDE = 1024
+CHAT_TABLES = ("chat_threads", "chat_messages", "chat_read_states")
+CHANGE_TRACKED_TABLES = ("chat_threads", "chat_read_states")
+
+
+def _enable_wal(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    # Only takes effect on a new, empty file (and has to come before the WAL
+    # switch writes its header); maintenance.py converts older shards.
+    cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+
+def delete_chat_threads(connection, thread_ids: List[int]):
+    placeholders, params = maintenance.in_clause(thread_ids)
+    hot = connection.execute(text(
+        f"SELECT id, thread_id, content FROM chat_messages WHERE thread_id IN ({placeholders})"
+    ), params).fetchall()
+    cold = chat_cold_storage.cold_messages(connection, thread_ids)
+    chat_search.unindex_messages(connection, list(hot) + cold)
+    for table in ("chat_messages", "chat_read_states"):
+        connection.execute(text(f"DELETE FROM {table} WHERE thread_id IN ({placeholders})"), params)
+    if cold:
+        connection.execute(text(
+            f"DELETE FROM {chat_cold_storage.COLD_TABLE} WHERE thread_id IN ({placeholders})"
+        ), params)
+    connection.execute(text(f"DELETE FROM chat_threads WHERE id IN ({placeholders})"), params)
+
+
+def clean_orphaned_chat_rows(engine) -> Dict:
+    """Remove messages and read states whose thread no longer exists in this chat database."""
+    def delete_rows(table):
+        def apply(connection, ids):
+            placeholders, params = maintenance.in_clause(ids)
+            if table == "chat_messages":
+                chat_search.unindex_messages(connection, connection.execute(text(
+                    f"SELECT id, thread_id, content FROM chat_messages WHERE id IN ({placeholders})"
+                ), params).fetchall())
+            connection.execute(text(f"DELETE FROM {table} WHERE id IN ({placeholders})"), params)
+        return apply
+
+    read_states, _ = maintenance.chunked(
+        engine,
+        "SELECT r.id FROM chat_read_states r LEFT JOIN chat_threads t ON t.id = r.thread_id "
+        "WHERE t.id IS NULL ORDER BY r.id LIMIT :limit",
+        delete_rows("chat_read_states"),
+    )
+    messages, _ = maintenance.chunked(
+        engine,
+        "SELECT m.id FROM chat_messages m LEFT JOIN chat_threads t ON t.id = m.thread_id "
+        "WHERE t.id IS NULL ORDER BY m.id LIMIT :limit",
+        delete_rows("chat_messages"),
+    )
+    return {"read_states_deleted": read_states, "messages_deleted": messages}
+
+
+class ChatShardStore:
+    """Chat threads, messages and read states hash-partitioned over SQLite files.
+
+    Each shard is its own database file with its own engine, so message writes
+    on different shards don't queue behind one another or behind devicelink.db.
+    The main database only keeps chat_thread_routes: one row per thread with its
+    participants and shard, written when the thread is created.
+    """
+
+    def __init__(self, metadata, shard_count: int = CHAT_SHARD_COUNT, directory: str = CHAT_SHARD_DIR):
+        if not 0 < shard_count <= MESSAGE_ID_STRIDE:
+            raise ValueError(f"shard_count must be between 1 and {MESSAGE_ID_STRIDE}")
+        self.shard_count = shard_count
+        self.directory = directory
+        self.metadata = metadata
+        self.engines = []
+        self._sessions = []
+        os.makedirs(directory, exist_ok=True)
+        for shard in range(shard_count):
+            self._open_shard(shard)
+
+    def _open_shard(self, shard: int):
+        shard_engine = create_engine(
+            f"sqlite:///{self.path(shard)}", connect_args={"check_same_thread": False}
+        )
+        event.listen(shard_engine, "connect", _enable_wal)
+        self.metadata.create_all(bind=shard_engine)
+        change_feed.ensure_change_tracking(shard_engine, CHANGE_TRACKED_TABLES)
+        # create_all skips indexes on tables that already exist, so add any new ones.
+        for table in self.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(bind=shard_engine, checkfirst=True)
+        chat_search.ensure_chat_search_tables(shard_engine)
+        chat_cold_storage.ensure_cold_storage_table(shard_engine)
+        with shard_engine.begin() as connection:
+            connection.execute(text(
+                "CREATE TABLE IF NOT EXISTS chat_id_sequence ("
+                " id INTEGER PRIMARY KEY CHECK (id = 1),"
+                " value INTEGER NOT NULL)"
+            ))
+            connection.execute(text("INSERT OR IGNORE INTO chat_id_sequence (id, value) VALUES (1, 0)"))
+        self.engines.append(shard_engine)
+        self._sessions.append(sessionmaker(autocommit=False, autoflush=False, bind=shard_engine))
+
+    def path(self, shard: int) -> str:
+        return os.path.join(self.directory, f"chat-{shard}.db")
+
+    def shard_for(self, thread_id: int) -> int:
+        return thread_id % self.shard_count
+
+    def session(self, shard: int):
+        return self._sessions[shard]()
+
+    def next_message_id(self, chat_db, shard: int) -> int:
+        sequence = chat_db.execute(
+            text("UPDATE chat_id_sequence SET value = value + 1 WHERE id = 1 RETURNING value")
+        ).scalar()
+        return sequence * MESSAGE_ID_STRIDE + shard
+
+    @staticmethod
+    def _reserve_ids_above(connection, message_id: int):
+        # Keeps ids increasing within a thread after it moves onto this shard.
+        connection.execute(
+            text("UPDATE chat_id_sequence SET value = MAX(value, :floor) WHERE id = 1"),
+            {"floor": message_id // MESSAGE_ID_STRIDE + 1},
+        )
+
+    # ----- migration and rebalancing -----
+
+    def _copy_threads(self, source, target, thread_ids: List[int]):
+        placeholders, params = maintenance.in_clause(thread_ids)
+        threads = source.execute(text(
+            "SELECT id, listing_id, owner_username, participant_username, created_at, updated_at "
+            f"FROM chat_threads WHERE id IN ({placeholders})"
+        ), params).fetchall()
+        messages = source.execute(text(
+            f"SELECT id, thread_id, sender_username, content, created_at FROM chat_messages "
+            f"WHERE thread_id IN ({placeholders})"
+        ), params).fetchall()
+        read_states = source.execute(text(
+            "SELECT thread_id, username, last_read_message_id, updated_at FROM chat_read_states "
+            f"WHERE thread_id IN ({placeholders})"
+        ), params).fetchall()
+
+        if threads:
+            target.execute(text(
+                "INSERT OR REPLACE INTO chat_threads "
+                "(id, listing_id, owner_username, participant_username, created_at, updated_at) "
+                "VALUES (:id, :listing_id, :owner, :participant, :created_at, :updated_at)"
+            ), [
+                {"id": t[0], "listing_id": t[1], "owner": t[2], "participant": t[3],
+                 "created_at": t[4], "updated_at": t[5]}
+                for t in threads
+            ])
+        if messages:
+            target.execute(text(
+                "INSERT OR REPLACE INTO chat_messages (id, thread_id, sender_username, content, created_at) "
+                "VALUES (:id, :thread_id, :sender, :content, :created_at)"
+            ), [
+                {"id": m[0], "thread_id": m[1], "sender": m[2], "content": m[3], "created_at": m[4]}
+                for m in messages
+            ])
+        # Cold threads move as their packed rows; their messages still need FTS rows on the target.
+        searchable = list(messages) + chat_cold_storage.copy_cold_threads(source, target, thread_ids)
+        if searchable:
+            chat_search.index_messages(target, [(m[0], m[1], m[3]) for m in searchable])
+            self._reserve_ids_above(target, max(m[0] for m in searchable))
+        if read_states:
+            target.execute(text(
+                f"DELETE FROM chat_read_states WHERE thread_id IN ({placeholders})"
+            ), params)
+            target.execute(text(
+                "INSERT INTO chat_read_states (thread_id, username, last_read_message_id, updated_at) "
+                "VALUES (:thread_id, :username, :last_read, :updated_at)"
+            ), [
+                {"thread_id": r[0], "username": r[1], "last_read": r[2], "updated_at": r[3]}
+                for r in read_states
+            ])
+        return len(threads), len(searchable)
+
+    def migrate_legacy(self, main_engine) -> Dict:
+        """Move chat rows still stored in devicelink.db into the shards, then drop those tables."""
+        with main_engine.connect() as connection:
+            existing = {
+                row[0] for row in connection.execute(text(
+                    "SELECT name FROM sqlite_master WHERE type = 'table'"
+                ))
+            }
+        if "chat_threads" not in existing:
+            return {"threads": 0, "messages": 0}
+
+        threads_moved = 0
+        messages_moved = 0
+        with main_engine.begin() as source:
+            legacy_max_message = source.execute(text("SELECT COALESCE(MAX(id), 0) FROM chat_messages")).scalar()
+            legacy_threads = source.execute(text(
+                "SELECT id, listing_id, owner_username, participant_username, created_at FROM chat_threads"
+            )).fetchall()
+            by_shard: Dict[int, List[int]] = {}
+            for thread in legacy_threads:
+                by_shard.setdefault(self.shard_for(thread[0]), []).append(thread[0])
+                source.execute(text(
+                    "INSERT OR IGNORE INTO chat_thread_routes "
+                    "(id, listing_id, owner_username, participant_username, shard, created_at) "
+                    "VALUES (:id, :listing_id, :owner, :participant, :shard, :created_at)"
+                ), {
+                    "id": thread[0], "listing_id": thread[1], "owner": thread[2],
+                    "participant": thread[3], "shard": self.shard_for(thread[0]), "created_at": thread[4],
+                })
+            for shard, thread_ids in by_shard.items():
+                for start in range(0, len(thread_ids), maintenance.CHUNK_SIZE):
+                    chunk = thread_ids[start:start + maintenance.CHUNK_SIZE]
+                    with self.engines[shard].begin() as target:
+                        threads, messages = self._copy_threads(source, target, chunk)
+                    threads_moved += threads
+                    messages_moved += messages
+            for shard_engine in self.engines:
+                with shard_engine.begin() as target:
+                    self._reserve_ids_above(target, legacy_max_message)
+            for table in (chat_search.FTS_TABLE, "chat_search_backfill") + CHAT_TABLES:
+                source.execute(text(f"DROP TABLE IF EXISTS {table}"))
+        return {"threads": threads_moved, "messages": messages_moved}
+
+    def rebalance(self, main_engine) -> Dict:
+        """Move every thread whose route points at a shard other than its hash shard.
+
+        Run with the backend stopped after changing CHAT_SHARD_COUNT.
+        """
+        with main_engine.connect() as connection:
+            routes = connection.execute(text("SELECT id, shard FROM chat_thread_routes")).fetchall()
+
+        moves: Dict[tuple, List[int]] = {}
+        for thread_id, shard in routes:
+            target = self.shard_for(thread_id)
+            if shard != target:
+                moves.setdefault((shard, target), []).append(thread_id)
+
+        moved = 0
+        missing_shards = set()
+        for (source_shard, target_shard), thread_ids in moves.items():
+            if source_shard >= self.shard_count:
+                if not os.path.exists(self.path(source_shard)):
+                    missing_shards.add(source_shard)
+                    continue
+                source_engine = create_engine(f"sqlite:///{self.path(source_shard)}")
+            else:
+                source_engine = self.engines[source_shard]
+            for start in range(0, len(thread_ids), maintenance.CHUNK_SIZE):
+                chunk = thread_ids[start:start + maintenance.CHUNK_SIZE]
+                with source_engine.begin() as source, self.engines[target_shard].begin() as target:
+                    self._copy_threads(source, target, chunk)
+                placeholders, params = maintenance.in_clause(chunk)
+                with main_engine.begin() as connection:
+                    connection.execute(text(
+                        f"UPDATE chat_thread_routes SET shard = :shard WHERE id IN ({placeholders})"
+                    ), dict(params, shard=target_shard))
+                with source_engine.begin() as source:
+                    delete_chat_threads(source, chunk)
+                moved += len(chunk)
+            if source_shard >= self.shard_count:
+                source_engine.dispose()
+        return {"threads_moved": moved, "missing_shards": sorted(missing_shards)}
+
+    # ----- maintenance jobs (called with the main engine) -----
+
+    def clean_orphaned_chat_data(self, main_engine) -> Dict:
+        deleted_by_shard: Dict[int, int] = {}
+
+        def apply(connection, ids):
+            placeholders, params = maintenance.in_clause(ids)
+            rows = connection.execute(text(
+                "SELECT id, shard, owner_username, participant_username "
+                f"FROM chat_thread_routes WHERE id IN ({placeholders})"
+            ), params).fetchall()
+            by_shard: Dict[int, List[int]] = {}
+            for thread_id, shard, _, _ in rows:
+                by_shard.setdefault(shard, []).append(thread_id)
+            for shard, thread_ids in by_shard.items():
+                if shard < self.shard_count:
+                    with self.engines[shard].begin() as chat_connection:
+                        delete_chat_threads(chat_connection, thread_ids)
+                deleted_by_shard[shard] = deleted_by_shard.get(shard, 0) + len(thread_ids)
+            if rows:
+                # Tombstones let clients polling GET /chat/threads?since= drop the threads.
+                last_seq = change_feed.next_change_seq(connection, len(rows))
+                connection.execute(
+                    text(
+                        "INSERT INTO chat_thread_tombstones "
+                        "(thread_id, owner_username, participant_username, change_seq, deleted_at) "
+                        "VALUES (:thread_id, :owner, :participant, :seq, :now)"
+                    ),
+                    [
+                        {"thread_id": thread_id, "owner": owner, "participant": participant,
+                         "seq": last_seq - len(rows) + 1 + i, "now": datetime.utcnow()}
+                        for i, (thread_id, _, owner, participant) in enumerate(rows)
+                    ],
+                )
+            connection.execute(text(f"DELETE FROM chat_thread_routes WHERE id IN ({placeholders})"), params)
+
+        threads, chunks = maintenance.chunked(
+            main_engine,
+            "SELECT r.id FROM chat_thread_routes r LEFT JOIN listings l ON l.id = r.listing_id "
+            "WHERE l.id IS NULL ORDER BY r.id LIMIT :limit",
+            apply,
+        )
+        metrics = {"threads_deleted": threads, "thread_chunks": chunks, "read_states_deleted": 0, "messages_deleted": 0}
+        for shard_engine in self.engines:
+            shard_metrics = clean_orphaned_chat_rows(shard_engine)
+            metrics["read_states_deleted"] += shard_metrics["read_states_deleted"]
+            metrics["messages_deleted"] += shard_metrics["messages_deleted"]
+        return metrics
+
+    def compact_inactive_threads(self, main_engine) -> Dict:
+        metrics: Dict[str, int] = {}
+        for shard_engine in self.engines:
+            for key, value in chat_cold_storage.compact_inactive_threads(shard_engine).items():
+                metrics[key] = metrics.get(key, 0) + value
+        return metrics
+
+    def analyze_and_vacuum(self, main_engine) -> Dict:
+        return {"shards": [maintenance.analyze_and_vacuum(shard_engine) for shard_engine in self.engines]}
+
+    def backfill_chat_search(self, main_engine) -> Dict:
+        indexed = 0
+        for shard_engine in self.engines:
+            indexed += chat_search.backfill_chat_search(shard_engine)["messages_indexed"]
+        return {"messages_indexed": indexed}
@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+"""
+Query Plan Check
+Seeds a throwaway database, calls every endpoint through the FastAPI test client
+and records each SQL statement it sends to devicelink.db and the chat shards.
+Every statement is run through EXPLAIN QUERY PLAN and the check fails when:
+
+  * a statement does a full SCAN of a table holding more than SCAN_ROW_THRESHOLD
+    rows (unless the endpoint is expected to return the whole table),
+  * SQLite needs a temporary B-tree to satisfy an ORDER BY,
+  * an endpoint issues more statements than its budget, which is how N+1
+    loops show up.
+
+Every route of the app has to be called by at least one ENDPOINTS entry, so
+a new endpoint fails the check until it is added there. tests/test_query_plans.py
+runs the same check under pytest. Needs httpx for the test client.
+
+Usage:
+    python check_query_plans.py [-v]
+"""
+
+import importlib
+import os
+import re
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+SCAN_ROW_THRESHOLD = 100
+
+SCAN_PATTERN = re.compile(r"^SCAN (\w+)(.*)$")
+CHECKED_STATEMENTS = ("SELECT", "UPDATE", "DELETE", "WITH")
+
+# (name, method, path, query params, json body, statement budget, tables it may scan)
+# Budgets are fixed numbers on purpose: the seeded users own dozens of rows,
+# so a per-row query anywhere blows straight through them.
+ENDPOINTS = [
+    ("login", "POST", "/login", None, {"username": "alice", "password": "secret-pass"}, 1, ()),
+    ("register", "POST", "/register", None, {"username": "newcomer", "password": "secret-pass"}, 2, ()),
+    ("browse listings", "GET", "/listings", {}, None, 3, ()),
+    ("browse listings filtered", "GET", "/listings", {"category": "Phones", "condition": "Used", "page": 2}, None, 3, ()),
+    ("search listings", "GET", "/listings", {"q": "device 4"}, None, 3, ("listings",)),
+    ("own listings", "GET", "/listings", {"own_username": "alice"}, None, 3, ()),
+    ("similar listings", "GET", "/listings/{listing_id}/similar", {}, None, 2, ()),
+    ("create listing", "POST", "/listings", None, {
+        "title": "Spare laptop", "description": "Works", "category": "Laptops",
+        "condition": "Used", "quantity": 1, "owner": "alice",
+    }, 4, ()),
+    ("update listing", "PUT", "/listings/{listing_id}", {"username": "alice"}, {
+        "title": "Spare phone", "description": "Updated", "category": "Phones",
+        "condition": "Used", "quantity": 2,
+    }, 5, ()),
+    ("complete listing", "POST", "/listings/{listing_id_2}/complete", {"username": "alice"},
+     {"recipient_username": "bob"}, 7, ()),
+    ("delete listing", "DELETE", "/listings/{pending_listing_id}", {"username": "alice"}, None, 5, ()),
+    ("donation history", "GET", "/donation-history", {"username": "alice"}, None, 2, ()),
+    ("create saved search", "POST", "/saved-searches", {"username": "alice"}, {"keywords": "tablet"}, 3, ()),
+    ("list saved searches", "GET", "/saved-searches", {"username": "alice"}, None, 1, ()),
+    ("saved search inbox", "GET", "/saved-searches/inbox", {"username": "alice", "mark_read": True}, None, 2, ()),
+    ("delete saved search", "DELETE", "/saved-searches/{saved_search_id}", {"username": "alice"}, None, 3, ()),
+    ("admin check", "GET", "/admin/check/alice", None, None, 1, ()),
+    ("admin users", "GET", "/admin/users", None, None, 1, ("users",)),
+    ("admin listings", "GET", "/admin/listings", None, None, 1, ("listings",)),
+    ("admin warning", "POST", "/admin/warning", {"admin_username": "admin"},
+     {"username": "user1", "reason": "Spam"}, 6, ()),
+    ("admin suspend", "POST", "/admin/suspend", {"admin_username": "admin"},
+     {"username": "user2", "is_suspended": True}, 5, ()),
+    ("approve listing", "POST", "/admin/approve-listing", {"admin_username": "admin"},
+     {"listing_id": "{pending_listing_id_2}", "approved": True}, 7, ()),
+    ("user warnings", "GET", "/admin/warnings/user1", None, None, 1, ()),
+    ("activity logs", "GET", "/admin/activity-logs", {"limit": 50}, None, 1, ()),
+    ("maintenance runs", "GET", "/admin/maintenance", {"admin_username": "admin"}, None, 2, ()),
+    ("create backup", "POST", "/admin/backups", {"admin_username": "admin"}, None, 2, ()),
+    ("list backups", "GET", "/admin/backups", {"admin_username": "admin"}, None, 2, ()),
+    ("transfer admin", "POST", "/admin/transfer", {"admin_username": "admin2"}, {"target_username": "user3"}, 4, ()),
+    ("open chat thread", "POST", "/chat/threads", None, {"listing_id": "{chat_listing_id}", "username": "alice"}, 13, ()),
+    ("chat threads", "GET", "/chat/threads", {"username": "alice"}, None, "threads", ()),
+    ("chat threads changes", "GET", "/chat/threads", {"username": "alice", "since": "{chat_since}"}, None, "thread_changes", ()),
+    ("chat search", "GET", "/chat/search", {"username": "alice", "q": "hello"}, None, "search", ()),
+    ("chat messages", "GET", "/chat/threads/{thread_id}/messages", {"username": "alice", "mark_read": True}, None, 8, ()),
+    ("chat mark read", "POST", "/chat/threads/{thread_id}/read", {"username": "alice"}, None, 6, ()),
+    ("send chat message", "POST", "/chat/threads/{thread_id}/messages", {"username": "alice"},
+     {"sender_username": "alice", "content": "hello again"}, 11, ()),
+    ("session bootstrap", "GET", "/session/bootstrap", {"username": "alice"}, None, "bootstrap", ()),
+    ("listing changes", "GET", "/listings", {"since": "{listing_since}"}, None, 4, ()),
+    ("own listing changes", "GET", "/listings", {"own_username": "alice", "since": "{listing_since}"}, None, 4, ()),
+]
+
+
+def _load_app(workdir):
+    os.chdir(workdir)
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    if "main" in sys.modules:
+        # main opens its databases relative to the working directory at import time.
+        app_main = importlib.reload(sys.modules["main"])
+    else:
+        import main as app_main
+
+    app_main.rate_limiter.enabled = False
+    return app_main
+
+
+def _seed(app_main, client):
+    db = app_main.SessionLocal()
+    hashed = app_main.HashHelper.get_password_hash("secret-pass")
+    db.add(app_main.User(username="admin", password=hashed, is_admin=True))
+    db.add(app_main.User(username="admin2", password=hashed, is_admin=True))
+    db.add(app_main.User(username="alice", password=hashed))
+    db.add(app_main.User(username="bob", password=hashed))
+    db.add_all(app_main.User(username=f"user{i}", password=hashed) for i in range(300))
+
+    now = datetime.utcnow()
+    categories = ("Phones", "Laptops", "Tablets", "Accessories")
+    conditions = ("New", "Used", "Refurbished")
+    for i in range(600):
+        owner = "alice" if i % 10 in (0, 2, 3) else f"user{i % 300}"
+        status = ("ACTIVE", "ACTIVE", "PENDING", "COMPLETED", "DELETED")[i % 5]
+        db.add(app_main.Listing(
+            title=f"Device {i}", description=f"A {categories[i % 4].lower()} in good shape",
+            category=categories[i % 4], condition=conditions[i % 3], quantity=1 + i % 5,
+            owner=owner, status=status, approved=status != "PENDING",
+            recipient_username="bob" if status == "COMPLETED" else None,
+            completed_at=now - timedelta(hours=i) if status == "COMPLETED" else None,
+            created_at=now - timedelta(hours=i),
+        ))
+    db.add_all(
+        app_main.UserWarning(username=f"user{i % 300}", reason="Spam", issued_by="admin", created_at=now)
+        for i in range(400)
+    )
+    db.add_all(
+        app_main.ActivityLog(action="seed", username=f"user{i % 300}", details="seed", created_at=now - timedelta(minutes=i))
+        for i in range(1000)
+    )
+    db.add_all(
+        app_main.SavedSearch(username=f"user{i % 300}", keywords=f"device {i}", created_at=now)
+        for i in range(300)
+    )
+    db.commit()
+
+    listings = db.query(app_main.Listing).order_by(app_main.Listing.id).all()
+    alice_active = [l.id for l in listings if l.owner == "alice" and l.status == "ACTIVE"]
+    alice_pending = [l.id for l in listings if l.owner == "alice" and l.status == "PENDING"]
+    others_active = [l.id for l in listings if l.owner != "alice" and l.status == "ACTIVE" and l.approved]
+    searches = [s.id for s in db.query(app_main.SavedSearch).all()]
+    db.add_all(
+        app_main.SavedSearchMatch(search_id=searches[i], username="alice", listing_id=others_active[i], created_at=now)
+        for i in range(40)
+    )
+    db.add_all(
+        app_main.SavedSearchMatch(search_id=searches[i], username=f"user{i}", listing_id=others_active[-i - 1], created_at=now)
+        for i in range(150)
+    )
+    db.commit()
+    db.close()
+
+    app_main.saved_search_index = app_main.load_saved_search_index()
+    app_main.similarity_index.load(app_main._load_similarity_documents())
+
+    thread_ids = []
+    for i, listing_id in enumerate(others_active[:40]):
+        thread = client.post("/chat/threads", json={"listing_id": listing_id, "username": "alice"}).json()
+        thread_ids.append(thread["id"])
+        for n in range(15):
+            sender = "alice" if n % 2 else thread["owner_username"]
+            client.post(
+                f"/chat/threads/{thread['id']}/messages",
+                params={"username": sender},
+                json={"sender_username": sender, "content": f"hello {i} message {n}"},
+            )
+
+    saved = client.post("/saved-searches", params={"username": "alice"}, json={"keywords": "camera"}).json()
+    with app_main.engine.connect() as conn:
+        listing_since = app_main.change_feed.current_change_seq(conn)
+    return {
+        "listing_since": listing_since,
+        "chat_since": app_main.change_feed.settled_mark(),
+        "listing_id": alice_active[0],
+        "listing_id_2": alice_active[1],
+        "pending_listing_id": alice_pending[0],
+        "pending_listing_id_2": alice_pending[1],
+        "chat_listing_id": others_active[60],
+        "thread_id": thread_ids[0],
+        "saved_search_id": saved["id"],
+    }
+
+
+class StatementRecorder:
+    def __init__(self, engines):
+        self.engines = engines
+        self.statements = []
+        self.paused = False
+        for engine in engines:
+            event.listen(engine, "before_cursor_execute", self._record(engine))
+
+    def _record(self, engine):
+        def listener(conn, cursor, statement, parameters, context, executemany):
+            if not self.paused:
+                self.statements.append((engine, statement, parameters))
+        return listener
+
+    def take(self):
+        statements, self.statements = self.statements, []
+        return statements
+
+
+def _table_sizes(engine, cache):
+    if engine not in cache:
+        with engine.connect() as conn:
+            names = [row[0] for row in conn.exec_driver_sql(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND sql NOT LIKE 'CREATE VIRTUAL%'"
+            )]
+            cache[engine] = {
+                name: conn.exec_driver_sql(f'SELECT count(*) FROM "{name}"').scalar() for name in names
+            }
+    return cache[engine]
+
+
+def _explain(engine, statement, parameters):
+    with engine.connect() as conn:
+        return [row[3] for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)]
+
+
+def _plan_problems(statement, plan, sizes, allowed_scans):
+    # Walking an index in order under a LIMIT stops after a page, so only flag those without one.
+    limited = " LIMIT " in f" {' '.join(statement.upper().split())} "
+    problems = []
+    for detail in plan:
+        if "USE TEMP B-TREE FOR ORDER BY" in detail or "USE TEMP B-TREE FOR RIGHT PART OF ORDER BY" in detail:
+            problems.append(detail)
+            continue
+        match = SCAN_PATTERN.match(detail)
+        if not match or "VIRTUAL TABLE" in match.group(2):
+            continue
+        if limited and "USING" in match.group(2):
+            continue
+        table = match.group(1)
+        if table in sizes and sizes[table] > SCAN_ROW_THRESHOLD and table not in allowed_scans:
+            problems.append(f"{detail} ({sizes[table]} rows)")
+    return problems
+
+
+def _fill(value, ids):
+    if isinstance(value, str):
+        return value.format(**ids) if "{" in value else value
+    if value is None:
+        return None
+    if isinstance(value, dict):
+        return {key: _fill(item, ids) for key, item in value.items()}
+    return value
+
+
+def _coerce_ids(body):
+    # Ids land in JSON bodies as strings after formatting; the endpoints expect ints.
+    return {key: int(value) if key.endswith("_id") and isinstance(value, str) else value for key, value in body.items()}
+
+
+def _uncovered_routes(app, requested):
+    """`METHOD /path` of every API route that no ENDPOINTS entry called."""
+    from fastapi.routing import APIRoute
+
+    missing = []
+    for route in app.routes:
+        if not isinstance(route, APIRoute):
+            continue
+        for method in sorted(route.methods):
+            if not any(called == method and route.path_regex.match(path) for called, path in requested):
+                missing.append(f"{method} {route.path}")
+    return missing
+
+
+def run(verbose: bool = False, workdir: str = None) -> int:
+    """Run the check and print a report; returns the number of failures."""
+    workdir = workdir or tempfile.mkdtemp(prefix="devicelink-plans-")
+    app_main = _load_app(workdir)
+    from fastapi.testclient import TestClient
+
+    print("=" * 50)
+    print("DeviceLink Query Plan Check")
+    print("=" * 50)
+
+    client = TestClient(app_main.app)
+    ids = _seed(app_main, client)
+    shard_count = len(app_main.chat_store.engines)
+    dynamic_budgets = {
+        # routes + listing titles, then threads and unread counts per shard
+        "threads": 3 + 4 * shard_count,
+        # user and thread tombstones, then per shard: changed threads, changed read
+        # states, threads behind those read states, unread counts and listing titles
+        "thread_changes": 2 + 6 * shard_count,
+        # user + routes, then per shard the thread-scoped FTS query and its cold threads
+        "search": 2 + 2 * shard_count,
+        # user, own and public listing pages, donation history, then the chat thread list
+        "bootstrap": 10 + 4 * shard_count,
+    }
+
+    engines = [app_main.engine] + list(app_main.chat_store.engines)
+    recorder = StatementRecorder(engines)
+    size_cache = {}
+    failures = 0
+    requested = []
+
+    for name, method, path, params, body, budget, allowed_scans in ENDPOINTS:
+        budget = dynamic_budgets.get(budget, budget)
+        request_body = _coerce_ids(_fill(body, ids)) if body is not None else None
+        recorder.take()
+        requested.append((method, _fill(path, ids)))
+        response = client.request(method, requested[-1][1], params=_fill(params, ids), json=request_body)
+        statements = recorder.take()
+
+        problems = []
+        if response.status_code >= 400:
+            problems.append(f"returned {response.status_code}: {response.text[:200]}")
+        if len(statements) > budget:
+            problems.append(f"issued {len(statements)} statements, budget is {budget}")
+
+        recorder.paused = True
+        for engine, statement, parameters in statements:
+            if not statement.lstrip().upper().startswith(CHECKED_STATEMENTS):
+                continue
+            plan = _explain(engine, statement, parameters)
+            for problem in _plan_problems(statement, plan, _table_sizes(engine, size_cache), allowed_scans):
+                problems.append(f"{problem}\n        in: {' '.join(statement.split())[:200]}")
+            if verbose:
+                print(f"      {' '.join(statement.split())[:120]}")
+                for detail in plan:
+                    print(f"        -> {detail}")
+        recorder.paused = False
+
+        marker = "✗" if problems else "✓"
+        print(f"{marker} {name:<28} {len(statements):>3}/{budget} statements")
+        for problem in problems:
+            print(f"    {problem}")
+        failures += bool(problems)
+
+    uncovered = _uncovered_routes(app_main.app, requested)
+    for route in uncovered:
+        print(f"✗ {route} is not in ENDPOINTS")
+    failures += len(uncovered)
+
+    print()
+    if failures:
+        print(f"✗ {failures} failure(s) in the query plan check")
+    else:
+        print(f"✓ All {len(ENDPOINTS)} endpoints passed")
+    return failures
+
+
+def main():
+    sys.exit(1 if run(verbose="-v" in sys.argv[1:]) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,31 @@
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import Depends, FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, create_engine, or_, text
+from sqlalchemy import Column, Index, Integer, String, Boolean, DateTime, Text, and_, create_engine, func, or_, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from pydantic import BaseModel, Field
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import Optional
 import bcrypt
 
+import backup
+import change_feed
+import chat_cold_storage
+import chat_search
+import chat_shards
+import maintenance
+import rate_limit
+from saved_search_index import SavedSearchEntry, SavedSearchIndex, tokenize
+from similarity_index import ListingSimilarityIndex, listing_tokens
+
 DATABASE_URL = "sqlite:///./devicelink.db"
 engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
+# Chat tables live in the shard databases managed by chat_shards.ChatShardStore.
+ChatBase = declarative_base()
 
 class User(Base):
     __tablename__ = "users"
@@ -31,16 +45,52 @@ class Listing(Base):
     condition = Column(String)
     quantity = Column(Integer)
     owner = Column(String)
-    status = Column(String, default='PENDING')  # PENDING, ACTIVE, DELETED, COMPLETED
+    status = Column(String, default='PENDING')  # PENDING, ACTIVE, DELETED, COMPLETED, EXPIRED
     approved = Column(Boolean, default=False)
     recipient_username = Column(String, nullable=True)
     completed_at = Column(DateTime, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    change_seq = Column(Integer, nullable=False, server_default="0", index=True)
+
+    __table_args__ = (
+        Index("ix_listings_approved_created", "approved", "created_at"),
+        Index("ix_listings_owner_created", "owner", "created_at"),
+        Index("ix_listings_owner_status_completed", "owner", "status", "completed_at", "created_at"),
+        Index("ix_listings_owner_change", "owner", "change_seq"),
+    )
+
+class ListingTombstone(Base):
+    # Written when a listing is hard-deleted so delta sync clients can drop it.
+    __tablename__ = "listing_tombstones"
+    id = Column(Integer, primary_key=True)
+    listing_id = Column(Integer)
+    owner = Column(String)
+    change_seq = Column(Integer, nullable=False, index=True)
+    deleted_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_listing_tombstones_owner_change", "owner", "change_seq"),
+    )
+
+class ChatThreadTombstone(Base):
+    # Written when the orphan cleanup deletes a chat thread so delta sync clients can drop it.
+    __tablename__ = "chat_thread_tombstones"
+    id = Column(Integer, primary_key=True)
+    thread_id = Column(Integer)
+    owner_username = Column(String)
+    participant_username = Column(String)
+    change_seq = Column(Integer, nullable=False)
+    deleted_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_chat_thread_tombstones_owner_change", "owner_username", "change_seq"),
+        Index("ix_chat_thread_tombstones_participant_change", "participant_username", "change_seq"),
+    )
 
 class UserWarning(Base):
     __tablename__ = "user_warnings"
     id = Column(Integer, primary_key=True, index=True)
-    username = Column(String)
+    username = Column(String, index=True)
     reason = Column(String)
     issued_by = Column(String)
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -51,35 +101,89 @@ class ActivityLog(Base):
     action = Column(String)
     username = Column(String)
     details = Column(String)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+class ChatThreadRoute(Base):
+    __tablename__ = "chat_thread_routes"
+    __table_args__ = {"sqlite_autoincrement": True}
+    id = Column(Integer, primary_key=True)  # the thread id
+    listing_id = Column(Integer, index=True)
+    owner_username = Column(String, index=True)
+    participant_username = Column(String, index=True)
+    shard = Column(Integer)
     created_at = Column(DateTime, default=datetime.utcnow)
 
-class ChatThread(Base):
+class ChatThread(ChatBase):
     __tablename__ = "chat_threads"
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True, autoincrement=False)
     listing_id = Column(Integer, index=True)
     owner_username = Column(String, index=True)
     participant_username = Column(String, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow)
+    change_seq = Column(Integer, nullable=False, server_default="0")
+
+    __table_args__ = (
+        Index("ix_chat_threads_owner_change", "owner_username", "change_seq"),
+        Index("ix_chat_threads_participant_change", "participant_username", "change_seq"),
+    )
 
-class ChatMessage(Base):
+class ChatMessage(ChatBase):
     __tablename__ = "chat_messages"
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True, autoincrement=False)
     thread_id = Column(Integer, index=True)
     sender_username = Column(String, index=True)
     content = Column(Text)
     created_at = Column(DateTime, default=datetime.utcnow)
 
-class ChatReadState(Base):
+    __table_args__ = (
+        Index("ix_chat_messages_thread_created", "thread_id", "created_at"),
+    )
+
+class ChatReadState(ChatBase):
     __tablename__ = "chat_read_states"
     id = Column(Integer, primary_key=True, index=True)
     thread_id = Column(Integer, index=True)
     username = Column(String, index=True)
     last_read_message_id = Column(Integer, default=0)
     updated_at = Column(DateTime, default=datetime.utcnow)
+    change_seq = Column(Integer, nullable=False, server_default="0")
+
+    __table_args__ = (
+        Index("ix_chat_read_states_username_change", "username", "change_seq"),
+    )
+
+class SavedSearch(Base):
+    __tablename__ = "saved_searches"
+    id = Column(Integer, primary_key=True, index=True)
+    username = Column(String, index=True)
+    keywords = Column(String, default="")
+    category = Column(String, nullable=True)
+    condition = Column(String, nullable=True)
+    min_quantity = Column(Integer, nullable=True)
+    max_quantity = Column(Integer, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class SavedSearchMatch(Base):
+    __tablename__ = "saved_search_matches"
+    id = Column(Integer, primary_key=True, index=True)
+    search_id = Column(Integer, index=True)
+    username = Column(String, index=True)
+    listing_id = Column(Integer)
+    is_read = Column(Boolean, default=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    __table_args__ = (
+        Index("ux_saved_search_matches_search_listing", "search_id", "listing_id", unique=True),
+    )
 
 Base.metadata.create_all(bind=engine)
 
+def ensure_indexes(metadata, bind):
+    # create_all only builds indexes for tables it creates, so add new ones to existing databases here.
+    for table in metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
+
 def ensure_listing_history_columns():
     with engine.begin() as connection:
         columns = {
@@ -91,10 +195,120 @@ def ensure_listing_history_columns():
         if "completed_at" not in columns:
             connection.execute(text("ALTER TABLE listings ADD COLUMN completed_at DATETIME"))
 
+def dedupe_saved_search_matches():
+    # Re-approving a listing used to match it again; keep the first match so the unique index can be built.
+    with engine.begin() as connection:
+        if connection.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'ux_saved_search_matches_search_listing'"
+        )).first():
+            return
+        connection.execute(text(
+            "DELETE FROM saved_search_matches WHERE id NOT IN "
+            "(SELECT MIN(id) FROM saved_search_matches GROUP BY search_id, listing_id)"
+        ))
+
 ensure_listing_history_columns()
+dedupe_saved_search_matches()
+change_feed.ensure_change_tracking(engine, ["listings"])
+ensure_indexes(Base.metadata, engine)
+maintenance.ensure_maintenance_tables(engine)
+
+chat_store = chat_shards.ChatShardStore(ChatBase.metadata)
+chat_store.migrate_legacy(engine)
+
+change_feed.track(Listing, tombstone=lambda listing, seq: ListingTombstone(listing_id=listing.id, owner=listing.owner, change_seq=seq))
+change_feed.track(ChatThread)
+change_feed.track(ChatReadState)
+
+def _saved_search_entry(search: SavedSearch):
+    return SavedSearchEntry(
+        id=search.id,
+        username=search.username,
+        keywords=frozenset(tokenize(search.keywords)),
+        category=search.category,
+        condition=search.condition,
+        min_quantity=search.min_quantity,
+        max_quantity=search.max_quantity,
+    )
+
+def load_saved_search_index():
+    db = SessionLocal()
+    searches = db.query(SavedSearch).all()
+    db.close()
+    index = SavedSearchIndex()
+    index.rebuild(_saved_search_entry(s) for s in searches)
+    return index
+
+saved_search_index = load_saved_search_index()
+
+similarity_index = ListingSimilarityIndex()
+
+def _load_similarity_documents():
+    db = SessionLocal()
+    listings = db.query(Listing).filter(
+        Listing.approved == True,
+        or_(Listing.status.is_(None), Listing.status == 'ACTIVE')
+    ).all()
+    db.close()
+    return [
+        (l.id, listing_tokens(l.title, l.description, l.category, l.condition))
+        for l in listings
+    ]
+
+def _refresh_similarity(listing: Listing):
+    if listing.approved and listing.status in (None, "ACTIVE"):
+        similarity_index.upsert(
+            listing.id,
+            listing_tokens(listing.title, listing.description, listing.category, listing.condition),
+        )
+    else:
+        similarity_index.remove(listing.id)
 
 app = FastAPI()
 
+rate_limiter = rate_limit.RateLimiter()
+
+BOOTSTRAP_SECTIONS = ("admin", "own_listings", "listings", "donation_history", "chat_threads")
+# Shared by all bootstrap requests; each section holds its own pooled connection while it runs.
+bootstrap_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="session-bootstrap")
+
+BACKUP_INTERVAL_SECONDS = 24 * 60 * 60
+BACKUP_JOB = "backup_databases"
+
+def _backup_targets():
+    return backup.default_targets(engine.url.database, chat_store.directory)
+
+def create_scheduled_backups(main_engine):
+    return backup.create_backup_set(_backup_targets())
+
+maintenance_scheduler = maintenance.MaintenanceScheduler(
+    engine,
+    jobs=maintenance.DEFAULT_JOBS + [
+        ("clean_orphaned_chat_data", chat_store.clean_orphaned_chat_data, 60 * 60),
+        ("analyze_and_vacuum_chat_shards", chat_store.analyze_and_vacuum, 24 * 60 * 60),
+        ("backfill_chat_search", chat_store.backfill_chat_search, 10 * 60),
+        ("compact_inactive_chat_threads", chat_store.compact_inactive_threads, 6 * 60 * 60),
+        # Under the lease, so only one worker takes the daily backup and rotates backups/.
+        (BACKUP_JOB, create_scheduled_backups, BACKUP_INTERVAL_SECONDS),
+    ],
+)
+
+@app.on_event("startup")
+def start_background_indexes():
+    similarity_index.start_background_build(_load_similarity_documents)
+
+@app.on_event("startup")
+async def start_maintenance_scheduler():
+    maintenance_scheduler.start()
+
+@app.on_event("shutdown")
+def stop_background_jobs():
+    bootstrap_executor.shutdown(wait=False)
+
+@app.on_event("shutdown")
+async def stop_maintenance_scheduler():
+    await maintenance_scheduler.stop()
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -163,7 +377,14 @@ class ChatMessageCreate(BaseModel):
 class ListingCompletionRequest(BaseModel):
     recipient_username: str
 
-@app.post("/register")
+class SavedSearchCreate(BaseModel):
+    keywords: str = ""
+    category: Optional[str] = None
+    condition: Optional[str] = None
+    min_quantity: Optional[int] = Field(None, ge=0)
+    max_quantity: Optional[int] = Field(None, ge=0)
+
+@app.post("/register", dependencies=[Depends(rate_limiter.dependency("auth"))])
 def register(user: UserSchema):
     db = SessionLocal()
     if db.query(User).filter(User.username == user.username).first():
@@ -177,7 +398,7 @@ def register(user: UserSchema):
     db.close()
     return {"message": "User created"}
 
-@app.post("/login")
+@app.post("/login", dependencies=[Depends(rate_limiter.dependency("auth"))])
 def login(user: UserSchema):
     db = SessionLocal()
     db_user = db.query(User).filter(User.username == user.username).first()
@@ -188,7 +409,23 @@ def login(user: UserSchema):
 
     return {"message": "Login successful"}
 
-@app.get("/listings")
+def _listing_to_dict(l: Listing):
+    return {
+        "id": l.id,
+        "title": l.title,
+        "description": l.description,
+        "category": l.category,
+        "condition": l.condition,
+        "quantity": l.quantity,
+        "owner": l.owner,
+        "status": getattr(l, 'status', 'ACTIVE'),  # Handle case where status column might not exist
+        "approved": l.approved,
+        "recipient_username": getattr(l, 'recipient_username', None),
+        "completed_at": l.completed_at.isoformat() if getattr(l, 'completed_at', None) else None,
+        "created_at": l.created_at.isoformat() if l.created_at else None,
+    }
+
+@app.get("/listings", dependencies=[Depends(rate_limiter.dependency("browse"))])
 def get_listings(
     q: Optional[str] = Query(None, description="Search term matched against title and description"),
     category: Optional[str] = Query(None, description="Filter by category"),
@@ -200,6 +437,7 @@ def get_listings(
     approved: bool = Query(True, description="Only include approved listings by default"),
     page: int = Query(1, ge=1, description="Page number starting at 1"),
     per_page: int = Query(20, ge=1, le=200, description="Results per page"),
+    since: Optional[int] = Query(None, ge=0, description="Only return changes after this high_water_mark"),
 ):
     """Browse/search/filter listings as a normal user.
 
@@ -207,20 +445,11 @@ def get_listings(
     Otherwise defaults to showing only approved listings. Supports pagination, text search
     (against title and description), and filters for category, condition,
     quantity range and owner.
-    Returns a dict with `items` and `meta` pagination info.
+    Returns a dict with `items` and `meta` pagination info; `meta.high_water_mark` can be
+    passed back as `since` to fetch only what changed (see _listing_changes).
     """
     db = SessionLocal()
-    query = db.query(Listing)
-
-    # If viewing own listings, show all; otherwise only approved listings that are not DELETED/COMPLETED
-    if own_username:
-        query = query.filter(Listing.owner == own_username)
-    else:
-        query = query.filter(Listing.approved == True)
-        # Filter out DELETED and COMPLETED listings, but handle cases where status might be null
-        query = query.filter(
-            or_(Listing.status.is_(None), Listing.status == 'ACTIVE')
-        )
+    query = _visible_listings(db, own_username)
 
     if q:
         like_term = f"%{q}%"
@@ -241,37 +470,107 @@ def get_listings(
     if max_quantity is not None:
         query = query.filter(Listing.quantity <= max_quantity)
 
+    if since is not None:
+        result = _listing_changes(db, query, since, per_page, owners=[name for name in (own_username, owner) if name])
+    else:
+        result = _listing_page(db, query, page, per_page)
+    db.close()
+    return result
+
+def _visible_listings(db, own_username: Optional[str] = None):
+    query = db.query(Listing)
+
+    # If viewing own listings, show all; otherwise only approved listings that are not DELETED/COMPLETED
+    if own_username:
+        query = query.filter(Listing.owner == own_username)
+    else:
+        query = query.filter(Listing.approved == True)
+        # Filter out DELETED and COMPLETED listings, but handle cases where status might be null
+        query = query.filter(
+            or_(Listing.status.is_(None), Listing.status == 'ACTIVE')
+        )
+    return query
+
+def _listing_page(db, query, page: int, per_page: int):
+    high_water_mark = change_feed.current_change_seq(db)
     total = query.count()
 
     items = query.order_by(Listing.created_at.desc()).offset((page - 1) * per_page).limit(per_page).all()
-    db.close()
-
-    def _serialize(l: Listing):
-        return {
-            "id": l.id,
-            "title": l.title,
-            "description": l.description,
-            "category": l.category,
-            "condition": l.condition,
-            "quantity": l.quantity,
-            "owner": l.owner,
-            "status": getattr(l, 'status', 'ACTIVE'),  # Handle case where status column might not exist
-            "approved": l.approved,
-            "recipient_username": getattr(l, 'recipient_username', None),
-            "completed_at": l.completed_at.isoformat() if getattr(l, 'completed_at', None) else None,
-            "created_at": l.created_at.isoformat() if l.created_at else None,
-        }
 
     return {
-        "items": [_serialize(l) for l in items],
+        "items": [_listing_to_dict(l) for l in items],
         "meta": {
             "total": total,
             "page": page,
             "per_page": per_page,
             "pages": (total + per_page - 1) // per_page if per_page else 0,
+            "high_water_mark": high_water_mark,
         },
     }
 
+def _listing_changes(db, query, since: int, limit: int, owners=()):
+    """Listings changed after `since`, oldest change first and at most `limit` of them.
+
+    Changed listings that still match `query` come back in `items`; ones that no
+    longer match (deleted, completed, unapproved, edited out of the filter) come
+    back as ids in `tombstones`. `owners` are the owner filters already applied to
+    `query`; an owner never changes, so other users' changes are left out of the
+    window instead of showing up as tombstones. When `has_more` is set, call again
+    with the returned `high_water_mark` to get the rest.
+    """
+    high_water_mark = change_feed.current_change_seq(db)
+    changed = db.query(Listing.change_seq, Listing.id).filter(
+        Listing.change_seq > since, Listing.change_seq <= high_water_mark
+    )
+    deleted = db.query(ListingTombstone.change_seq, ListingTombstone.listing_id).filter(
+        ListingTombstone.change_seq > since, ListingTombstone.change_seq <= high_water_mark
+    )
+    for name in owners:
+        changed = changed.filter(Listing.owner == name)
+        deleted = deleted.filter(ListingTombstone.owner == name)
+    window = [
+        (seq, listing_id, False)
+        for seq, listing_id in changed.order_by(Listing.change_seq).limit(limit + 1)
+    ]
+    window.extend(
+        (seq, listing_id, True)
+        for seq, listing_id in deleted.order_by(ListingTombstone.change_seq).limit(limit + 1)
+    )
+    window.sort()
+    has_more = len(window) > limit
+    window = window[:limit]
+    if has_more:
+        high_water_mark = window[-1][0]
+
+    changed_ids = [listing_id for _, listing_id, deleted in window if not deleted]
+    items = query.filter(Listing.id.in_(changed_ids)).all() if changed_ids else []
+    items.sort(key=lambda l: l.change_seq)
+    visible = {l.id for l in items}
+    return {
+        "items": [_listing_to_dict(l) for l in items],
+        "tombstones": sorted({listing_id for _, listing_id, _ in window} - visible),
+        "high_water_mark": high_water_mark,
+        "has_more": has_more,
+    }
+
+@app.get("/listings/{listing_id}/similar")
+def get_similar_listings(listing_id: int, limit: int = Query(5, ge=1, le=20)):
+    similar_ids = similarity_index.similar(listing_id, limit)
+    db = SessionLocal()
+    if not similar_ids:
+        exists = db.query(Listing.id).filter(Listing.id == listing_id).first()
+        db.close()
+        if not exists:
+            raise HTTPException(status_code=404, detail="Listing not found")
+        return {"listing_id": listing_id, "items": []}
+
+    by_id = {l.id: l for l in db.query(Listing).filter(Listing.id.in_(similar_ids)).all()}
+    db.close()
+    return {
+        "listing_id": listing_id,
+        "items": [_listing_to_dict(by_id[i]) for i in similar_ids if i in by_id],
+    }
+
 @app.post("/listings")
 def create_listing(listing: ListingCreate):
     db = SessionLocal()
@@ -325,6 +624,7 @@ def update_listing(listing_id: int, listing: ListingUpdate, username: str):
     db_listing.approved = False
     db.commit()
     db.refresh(db_listing)
+    similarity_index.remove(listing_id)
     
     log_entry = ActivityLog(
         action="listing_updated",
@@ -357,6 +657,7 @@ def delete_listing(listing_id: int, username: str):
     db.add(log_entry)
     db.commit()
     db.close()
+    similarity_index.remove(listing_id)
     return {"message": "Listing deleted successfully"}
 
 @app.post("/listings/{listing_id}/complete")
@@ -389,6 +690,7 @@ def complete_listing(listing_id: int, username: str, payload: ListingCompletionR
     db_listing.completed_at = datetime.utcnow()
     db.commit()
     db.refresh(db_listing)
+    similarity_index.remove(listing_id)
 
     log_entry = ActivityLog(
         action="listing_completed",
@@ -416,12 +718,17 @@ def get_donation_history(username: str):
         db.close()
         raise HTTPException(status_code=404, detail="User not found")
 
+    result = _donation_history(db, username)
+    db.close()
+    return result
+
+def _donation_history(db, username: str):
     listings = db.query(Listing).filter(
         Listing.owner == username,
         Listing.status == "COMPLETED"
     ).order_by(Listing.completed_at.desc(), Listing.created_at.desc()).all()
 
-    result = [
+    return [
         {
             "id": listing.id,
             "title": listing.title,
@@ -434,9 +741,148 @@ def get_donation_history(username: str):
         }
         for listing in listings
     ]
+
+# ========== SAVED SEARCH ENDPOINTS ==========
+
+def _saved_search_to_dict(search: SavedSearch):
+    return {
+        "id": search.id,
+        "keywords": search.keywords,
+        "category": search.category,
+        "condition": search.condition,
+        "min_quantity": search.min_quantity,
+        "max_quantity": search.max_quantity,
+        "created_at": search.created_at.isoformat() if search.created_at else None,
+    }
+
+def _notify_saved_searches(db, listing: Listing):
+    matches = saved_search_index.match(
+        listing.title, listing.description, listing.category, listing.condition, listing.quantity
+    )
+    rows = [
+        {"search_id": entry.id, "username": entry.username, "listing_id": listing.id}
+        for entry in matches
+        if entry.username != listing.owner
+    ]
+    # A listing that is rejected and approved again must not notify the same search twice.
+    for start in range(0, len(rows), maintenance.CHUNK_SIZE):
+        db.execute(
+            sqlite_insert(SavedSearchMatch).values(rows[start:start + maintenance.CHUNK_SIZE]).on_conflict_do_nothing(
+                index_elements=["search_id", "listing_id"]
+            )
+        )
+
+@app.post("/saved-searches")
+def create_saved_search(username: str, payload: SavedSearchCreate):
+    db = SessionLocal()
+    user = db.query(User).filter(User.username == username).first()
+    if not user:
+        db.close()
+        raise HTTPException(status_code=404, detail="User not found")
+    if (
+        payload.min_quantity is not None
+        and payload.max_quantity is not None
+        and payload.min_quantity > payload.max_quantity
+    ):
+        db.close()
+        raise HTTPException(status_code=400, detail="min_quantity cannot exceed max_quantity")
+    if not (
+        tokenize(payload.keywords) or payload.category or payload.condition
+        or payload.min_quantity is not None or payload.max_quantity is not None
+    ):
+        # A search without any criteria would match every approved listing.
+        db.close()
+        raise HTTPException(status_code=400, detail="Saved search needs keywords or at least one filter")
+
+    search = SavedSearch(
+        username=username,
+        keywords=payload.keywords.strip(),
+        category=payload.category or None,
+        condition=payload.condition or None,
+        min_quantity=payload.min_quantity,
+        max_quantity=payload.max_quantity,
+    )
+    db.add(search)
+    db.commit()
+    db.refresh(search)
+    saved_search_index.add(_saved_search_entry(search))
+
+    result = _saved_search_to_dict(search)
     db.close()
     return result
 
+@app.get("/saved-searches")
+def get_saved_searches(username: str):
+    db = SessionLocal()
+    searches = db.query(SavedSearch).filter(SavedSearch.username == username).order_by(SavedSearch.id.asc()).all()
+    result = [_saved_search_to_dict(s) for s in searches]
+    db.close()
+    return result
+
+@app.delete("/saved-searches/{search_id}")
+def delete_saved_search(search_id: int, username: str):
+    db = SessionLocal()
+    search = db.query(SavedSearch).filter(SavedSearch.id == search_id).first()
+    if not search:
+        db.close()
+        raise HTTPException(status_code=404, detail="Saved search not found")
+    if search.username != username:
+        db.close()
+        raise HTTPException(status_code=403, detail="Not authorized to delete this saved search")
+
+    db.query(SavedSearchMatch).filter(SavedSearchMatch.search_id == search_id).delete()
+    db.delete(search)
+    db.commit()
+    db.close()
+    saved_search_index.remove(search_id)
+    return {"message": "Saved search deleted successfully"}
+
+@app.get("/saved-searches/inbox")
+def get_saved_search_inbox(
+    username: str,
+    unread_only: bool = False,
+    mark_read: bool = False,
+    before_id: Optional[int] = Query(None, description="Return matches older than this match id (from next_before_id)"),
+    limit: int = Query(50, ge=1, le=200),
+):
+    db = SessionLocal()
+    query = db.query(SavedSearchMatch, Listing).join(
+        Listing, Listing.id == SavedSearchMatch.listing_id
+    ).filter(SavedSearchMatch.username == username)
+    if unread_only:
+        query = query.filter(SavedSearchMatch.is_read == False)
+    if before_id is not None:
+        query = query.filter(SavedSearchMatch.id < before_id)
+    rows = query.order_by(SavedSearchMatch.id.desc()).limit(limit + 1).all()
+
+    items = [
+        {
+            "id": match.id,
+            "search_id": match.search_id,
+            "listing_id": listing.id,
+            "listing_title": listing.title,
+            "category": listing.category,
+            "condition": listing.condition,
+            "quantity": listing.quantity,
+            "owner": listing.owner,
+            "is_read": match.is_read,
+            "created_at": match.created_at.isoformat() if match.created_at else None,
+        }
+        for match, listing in rows[:limit]
+    ]
+    if mark_read and items:
+        # Only the page that was returned; older matches stay unread until they are fetched.
+        db.query(SavedSearchMatch).filter(
+            SavedSearchMatch.id.in_([item["id"] for item in items]),
+            SavedSearchMatch.is_read == False
+        ).update({SavedSearchMatch.is_read: True}, synchronize_session=False)
+        db.commit()
+    db.close()
+    return {
+        "items": items,
+        "next_before_id": items[-1]["id"] if len(rows) > limit else None,
+    }
+
 # ========== ADMIN ENDPOINTS ==========
 
 @app.get("/admin/check/{username}")
@@ -569,12 +1015,16 @@ def approve_listing(admin_username: str, approval: ListingApprovalUpdate):
         db.close()
         raise HTTPException(status_code=404, detail="Listing not found")
 
+    was_active = listing.approved and listing.status == "ACTIVE"
     listing.approved = approval.approved
     if approval.approved:
         listing.status = "ACTIVE"
+        if not was_active:
+            _notify_saved_searches(db, listing)
     else:
         listing.status = "REJECTED"
     db.commit()
+    _refresh_similarity(listing)
 
     status = "approved" if approval.approved else "rejected"
     log_entry = ActivityLog(
@@ -587,6 +1037,58 @@ def approve_listing(admin_username: str, approval: ListingApprovalUpdate):
     db.close()
     return {"message": f"Listing {status}"}
 
+@app.post("/admin/backups")
+def create_database_backup(admin_username: str):
+    db = SessionLocal()
+    admin = db.query(User).filter(User.username == admin_username).first()
+    if not admin or not admin.is_admin:
+        db.close()
+        raise HTTPException(status_code=403, detail="Only admins can create backups")
+    db.close()
+
+    try:
+        results = [backup.create_backup(**target) for target in _backup_targets()]
+    except (backup.BackupError, OSError) as exc:
+        raise HTTPException(status_code=500, detail=f"Backup failed: {exc}")
+
+    db = SessionLocal()
+    log_entry = ActivityLog(
+        action="database_backup_created",
+        username=admin_username,
+        details=f"Created backups {', '.join(r['name'] for r in results)} ({sum(r['size_bytes'] for r in results)} bytes)"
+    )
+    db.add(log_entry)
+    db.commit()
+    db.close()
+    return [
+        {"name": r["name"], "size_bytes": r["size_bytes"], "duration_seconds": r["duration_seconds"], "rotated": r["rotated"]}
+        for r in results
+    ]
+
+@app.get("/admin/backups")
+def get_database_backups(admin_username: str):
+    db = SessionLocal()
+    admin = db.query(User).filter(User.username == admin_username).first()
+    db.close()
+    if not admin or not admin.is_admin:
+        raise HTTPException(status_code=403, detail="Only admins can view backups")
+    return {
+        "backups": [{k: b[k] for k in ("name", "size_bytes", "created_at")} for b in backup.list_backups()],
+        "last_scheduled_error": (maintenance.last_run(engine, BACKUP_JOB) or {}).get("error"),
+    }
+
+@app.get("/admin/maintenance")
+def get_maintenance_runs(admin_username: str, limit: int = Query(50, ge=1, le=200)):
+    db = SessionLocal()
+    admin = db.query(User).filter(User.username == admin_username).first()
+    db.close()
+    if not admin or not admin.is_admin:
+        raise HTTPException(status_code=403, detail="Only admins can view maintenance runs")
+    return {
+        "is_leader": maintenance_scheduler.is_leader,
+        "runs": maintenance.recent_runs(engine, limit),
+    }
+
 @app.get("/admin/warnings/{username}")
 def get_user_warnings(username: str):
     db = SessionLocal()
@@ -603,8 +1105,8 @@ def get_activity_logs(limit: int = 50):
 
 # ========== CHAT ENDPOINTS ==========
 
-def _get_or_create_read_state(db, thread_id: int, username: str):
-    state = db.query(ChatReadState).filter(
+def _get_or_create_read_state(chat_db, thread_id: int, username: str):
+    state = chat_db.query(ChatReadState).filter(
         ChatReadState.thread_id == thread_id,
         ChatReadState.username == username
     ).first()
@@ -615,36 +1117,56 @@ def _get_or_create_read_state(db, thread_id: int, username: str):
             last_read_message_id=0,
             updated_at=datetime.utcnow()
         )
-        db.add(state)
-        db.commit()
-        db.refresh(state)
+        chat_db.add(state)
+        chat_db.commit()
+        chat_db.refresh(state)
     return state
 
-def _get_unread_count(db, thread_id: int, username: str):
-    state = _get_or_create_read_state(db, thread_id, username)
-    unread_count = db.query(ChatMessage).filter(
-        ChatMessage.thread_id == thread_id,
-        ChatMessage.id > state.last_read_message_id,
+def _get_unread_counts(chat_db, thread_ids, username: str):
+    """Unread counts for several threads in one query, creating any missing read states."""
+    existing = {
+        state.thread_id
+        for state in chat_db.query(ChatReadState.thread_id).filter(
+            ChatReadState.thread_id.in_(thread_ids),
+            ChatReadState.username == username
+        )
+    }
+    missing = [thread_id for thread_id in thread_ids if thread_id not in existing]
+    if missing:
+        now = datetime.utcnow()
+        chat_db.add_all(
+            ChatReadState(thread_id=thread_id, username=username, last_read_message_id=0, updated_at=now)
+            for thread_id in missing
+        )
+        chat_db.commit()
+
+    rows = chat_db.query(ChatMessage.thread_id, func.count(ChatMessage.id)).join(
+        ChatReadState,
+        and_(ChatReadState.thread_id == ChatMessage.thread_id, ChatReadState.username == username)
+    ).filter(
+        ChatMessage.thread_id.in_(thread_ids),
+        ChatMessage.id > ChatReadState.last_read_message_id,
         ChatMessage.sender_username != username
-    ).count()
-    return unread_count
-
-def _mark_thread_as_read(db, thread_id: int, username: str):
-    state = _get_or_create_read_state(db, thread_id, username)
-    latest_message = db.query(ChatMessage).filter(
+    ).group_by(ChatMessage.thread_id).all()
+    counts = {thread_id: 0 for thread_id in thread_ids}
+    counts.update(rows)
+    return counts
+
+def _mark_thread_as_read(chat_db, thread_id: int, username: str):
+    state = _get_or_create_read_state(chat_db, thread_id, username)
+    latest_message = chat_db.query(ChatMessage).filter(
         ChatMessage.thread_id == thread_id
     ).order_by(ChatMessage.id.desc()).first()
-    state.last_read_message_id = latest_message.id if latest_message else 0
+    cold_last_id = chat_cold_storage.cold_last_message_id(chat_db, thread_id)
+    state.last_read_message_id = max(latest_message.id if latest_message else 0, cold_last_id or 0)
     state.updated_at = datetime.utcnow()
-    db.commit()
+    chat_db.commit()
 
-def _thread_to_dict(db, thread: ChatThread, viewer_username: Optional[str] = None):
-    listing = db.query(Listing).filter(Listing.id == thread.listing_id).first()
-    unread_count = _get_unread_count(db, thread.id, viewer_username) if viewer_username else 0
+def _thread_to_dict(thread: ChatThread, listing_title: Optional[str], unread_count: int = 0):
     return {
         "id": thread.id,
         "listing_id": thread.listing_id,
-        "listing_title": listing.title if listing else "Unknown listing",
+        "listing_title": listing_title or "Unknown listing",
         "owner_username": thread.owner_username,
         "participant_username": thread.participant_username,
         "unread_count": unread_count,
@@ -652,10 +1174,29 @@ def _thread_to_dict(db, thread: ChatThread, viewer_username: Optional[str] = Non
         "updated_at": thread.updated_at.isoformat() if thread.updated_at else None,
     }
 
-def _assert_thread_access(thread: ChatThread, username: str):
+def _assert_thread_access(thread, username: str):
     if username not in [thread.owner_username, thread.participant_username]:
         raise HTTPException(status_code=403, detail="Not authorized for this chat thread")
 
+def _get_thread_route(db, thread_id: int):
+    route = db.query(ChatThreadRoute).filter(ChatThreadRoute.id == thread_id).first()
+    if not route:
+        db.close()
+        raise HTTPException(status_code=404, detail="Chat thread not found")
+    return route
+
+def _user_routes_by_shard(db, username: str):
+    routes = db.query(ChatThreadRoute).filter(
+        or_(
+            ChatThreadRoute.owner_username == username,
+            ChatThreadRoute.participant_username == username
+        )
+    ).all()
+    by_shard = {}
+    for route in routes:
+        by_shard.setdefault(route.shard, []).append(route)
+    return by_shard
+
 @app.post("/chat/threads")
 def create_or_get_chat_thread(payload: ChatThreadCreate):
     db = SessionLocal()
@@ -673,66 +1214,196 @@ def create_or_get_chat_thread(payload: ChatThreadCreate):
         db.close()
         raise HTTPException(status_code=400, detail="Listing owner cannot create a chat with themselves")
 
-    thread = db.query(ChatThread).filter(
-        ChatThread.listing_id == payload.listing_id,
-        ChatThread.owner_username == listing.owner,
-        ChatThread.participant_username == payload.username
+    route = db.query(ChatThreadRoute).filter(
+        ChatThreadRoute.listing_id == payload.listing_id,
+        ChatThreadRoute.owner_username == listing.owner,
+        ChatThreadRoute.participant_username == payload.username
     ).first()
 
-    if not thread:
-        thread = ChatThread(
+    if not route:
+        route = ChatThreadRoute(
             listing_id=payload.listing_id,
             owner_username=listing.owner,
-            participant_username=payload.username,
-            updated_at=datetime.utcnow()
+            participant_username=payload.username
         )
-        db.add(thread)
+        db.add(route)
+        db.flush()
+        route.shard = chat_store.shard_for(route.id)
         db.commit()
-        db.refresh(thread)
+        db.refresh(route)
 
-    # Ensure read-state rows exist for both participants.
-    _get_or_create_read_state(db, thread.id, thread.owner_username)
-    _get_or_create_read_state(db, thread.id, thread.participant_username)
+    chat_db = chat_store.session(route.shard)
+    thread = chat_db.query(ChatThread).filter(ChatThread.id == route.id).first()
+    if not thread:
+        now = datetime.utcnow()
+        thread = ChatThread(
+            id=route.id,
+            listing_id=route.listing_id,
+            owner_username=route.owner_username,
+            participant_username=route.participant_username,
+            updated_at=now
+        )
+        chat_db.add(thread)
+        # New threads get read-state rows for both participants in the same commit.
+        chat_db.add_all(
+            ChatReadState(thread_id=route.id, username=name, last_read_message_id=0, updated_at=now)
+            for name in (route.owner_username, route.participant_username)
+        )
+        chat_db.commit()
+        chat_db.refresh(thread)
+        unread_count = 0
+    else:
+        unread_count = _get_unread_counts(chat_db, [thread.id], payload.username)[thread.id]
 
-    result = _thread_to_dict(db, thread, payload.username)
+    result = _thread_to_dict(thread, listing.title, unread_count)
+    chat_db.close()
     db.close()
     return result
 
-@app.get("/chat/threads")
-def get_chat_threads(username: str):
+@app.get("/chat/threads", dependencies=[Depends(rate_limiter.dependency("chat_poll"))])
+def get_chat_threads(
+    username: str,
+    since: Optional[int] = Query(None, ge=0, description="Only return threads changed after this high_water_mark"),
+):
     db = SessionLocal()
     user = db.query(User).filter(User.username == username).first()
     if not user:
         db.close()
         raise HTTPException(status_code=404, detail="User not found")
 
-    threads = db.query(ChatThread).filter(
-        or_(
-            ChatThread.owner_username == username,
-            ChatThread.participant_username == username
+    if since:
+        result = _chat_thread_changes(db, username, since)
+    else:
+        high_water_mark = change_feed.settled_mark()
+        result = _user_chat_threads(db, username)
+        if since is not None:
+            result = {"items": result, "high_water_mark": high_water_mark}
+    db.close()
+    return result
+
+def _user_chat_threads(db, username: str):
+    routes_by_shard = _user_routes_by_shard(db, username)
+    listing_ids = {route.listing_id for routes in routes_by_shard.values() for route in routes}
+    titles = dict(db.query(Listing.id, Listing.title).filter(Listing.id.in_(listing_ids)).all()) if listing_ids else {}
+
+    threads = []
+    for shard, routes in routes_by_shard.items():
+        thread_ids = [route.id for route in routes]
+        chat_db = chat_store.session(shard)
+        shard_threads = chat_db.query(ChatThread).filter(ChatThread.id.in_(thread_ids)).all()
+        unread_counts = _get_unread_counts(chat_db, thread_ids, username)
+        threads.extend(
+            (t.updated_at or datetime.min, _thread_to_dict(t, titles.get(t.listing_id), unread_counts.get(t.id, 0)))
+            for t in shard_threads
+        )
+        chat_db.close()
+
+    threads.sort(key=lambda item: item[0], reverse=True)
+    return [thread for _, thread in threads]
+
+def _chat_thread_changes(db, username: str, since: int):
+    """The user's threads whose row or read state changed after `since`.
+
+    Reads each shard through the change_seq indexes instead of walking the
+    user's routes, so a poll with nothing new costs a handful of index probes.
+    Threads deleted since then come back as ids in `tombstones`.
+    """
+    high_water_mark = change_feed.settled_mark(since)
+    tombstones = sorted({
+        thread_id for (thread_id,) in db.query(ChatThreadTombstone.thread_id).filter(
+            or_(ChatThreadTombstone.owner_username == username, ChatThreadTombstone.participant_username == username),
+            ChatThreadTombstone.change_seq > since
         )
-    ).order_by(ChatThread.updated_at.desc()).all()
+    })
+    threads = []
+    for shard in range(chat_store.shard_count):
+        chat_db = chat_store.session(shard)
+        changed = chat_db.query(ChatThread).filter(
+            or_(ChatThread.owner_username == username, ChatThread.participant_username == username),
+            ChatThread.change_seq > since
+        ).all()
+        seen = {t.id for t in changed}
+        read_ids = [
+            state.thread_id
+            for state in chat_db.query(ChatReadState.thread_id).filter(
+                ChatReadState.username == username,
+                ChatReadState.change_seq > since
+            )
+            if state.thread_id not in seen
+        ]
+        if read_ids:
+            changed.extend(chat_db.query(ChatThread).filter(ChatThread.id.in_(read_ids)).all())
+        if changed:
+            unread_counts = _get_unread_counts(chat_db, [t.id for t in changed], username)
+            titles = dict(db.query(Listing.id, Listing.title).filter(
+                Listing.id.in_({t.listing_id for t in changed})
+            ).all())
+            threads.extend(
+                (t.updated_at or datetime.min, _thread_to_dict(t, titles.get(t.listing_id), unread_counts.get(t.id, 0)))
+                for t in changed
+            )
+        chat_db.close()
+
+    threads.sort(key=lambda item: item[0], reverse=True)
+    return {"items": [thread for _, thread in threads], "tombstones": tombstones, "high_water_mark": high_water_mark}
+
+@app.get("/chat/search")
+def search_chat_messages(
+    username: str,
+    q: str = Query(..., min_length=1, max_length=200, description="Words to find in the user's chat messages"),
+    before_id: Optional[int] = Query(None, description="Return messages older than this message id (from next_before_id)"),
+    limit: int = Query(20, ge=1, le=100),
+):
+    db = SessionLocal()
+    user = db.query(User).filter(User.username == username).first()
+    if not user:
+        db.close()
+        raise HTTPException(status_code=404, detail="User not found")
 
-    result = [_thread_to_dict(db, t, username) for t in threads]
+    routes_by_shard = _user_routes_by_shard(db, username)
     db.close()
-    return result
+
+    routes_by_id = {}
+    matches = []
+    for shard, routes in routes_by_shard.items():
+        routes_by_id.update((route.id, route) for route in routes)
+        chat_db = chat_store.session(shard)
+        matches.extend(chat_search.search_messages(chat_db, [route.id for route in routes], q, before_id, limit + 1))
+        chat_db.close()
+
+    matches.sort(key=lambda match: match["message_id"], reverse=True)
+    items = matches[:limit]
+    for item in items:
+        route = routes_by_id[item["thread_id"]]
+        item["listing_id"] = route.listing_id
+        item["other_username"] = route.participant_username if route.owner_username == username else route.owner_username
+    return {
+        "items": items,
+        "next_before_id": items[-1]["message_id"] if len(matches) > limit else None,
+    }
 
 @app.get("/chat/threads/{thread_id}/messages")
 def get_chat_messages(thread_id: int, username: str, after_id: Optional[int] = None, mark_read: bool = False):
     db = SessionLocal()
-    thread = db.query(ChatThread).filter(ChatThread.id == thread_id).first()
-    if not thread:
-        db.close()
-        raise HTTPException(status_code=404, detail="Chat thread not found")
+    route = _get_thread_route(db, thread_id)
+    db.close()
 
-    _assert_thread_access(thread, username)
+    _assert_thread_access(route, username)
 
-    query = db.query(ChatMessage).filter(ChatMessage.thread_id == thread_id)
+    chat_db = chat_store.session(route.shard)
+    # Compacted threads keep their older messages in cold storage; anything newer is still in chat_messages.
+    result = []
+    cold_last_id = chat_cold_storage.cold_last_message_id(chat_db, thread_id)
+    if cold_last_id is not None and (after_id is None or after_id < cold_last_id):
+        cold_messages = chat_cold_storage.load_cold_messages(chat_db, thread_id, cold_last_id)
+        result.extend(m for m in cold_messages if after_id is None or m["id"] > after_id)
+
+    query = chat_db.query(ChatMessage).filter(ChatMessage.thread_id == thread_id)
     if after_id is not None:
         query = query.filter(ChatMessage.id > after_id)
     messages = query.order_by(ChatMessage.created_at.asc()).all()
 
-    result = [
+    result += [
         {
             "id": m.id,
             "thread_id": m.thread_id,
@@ -743,53 +1414,59 @@ def get_chat_messages(thread_id: int, username: str, after_id: Optional[int] = N
         for m in messages
     ]
     if mark_read:
-        _mark_thread_as_read(db, thread_id, username)
-    db.close()
+        _mark_thread_as_read(chat_db, thread_id, username)
+    chat_db.close()
     return result
 
 @app.post("/chat/threads/{thread_id}/read")
 def mark_chat_thread_read(thread_id: int, username: str):
     db = SessionLocal()
-    thread = db.query(ChatThread).filter(ChatThread.id == thread_id).first()
-    if not thread:
-        db.close()
-        raise HTTPException(status_code=404, detail="Chat thread not found")
-
-    _assert_thread_access(thread, username)
-    _mark_thread_as_read(db, thread_id, username)
+    route = _get_thread_route(db, thread_id)
     db.close()
+
+    _assert_thread_access(route, username)
+    chat_db = chat_store.session(route.shard)
+    _mark_thread_as_read(chat_db, thread_id, username)
+    chat_db.close()
     return {"message": "Thread marked as read"}
 
-@app.post("/chat/threads/{thread_id}/messages")
+@app.post("/chat/threads/{thread_id}/messages", dependencies=[Depends(rate_limiter.dependency("chat_send"))])
 def send_chat_message(thread_id: int, username: str, payload: ChatMessageCreate):
     db = SessionLocal()
-    thread = db.query(ChatThread).filter(ChatThread.id == thread_id).first()
-    if not thread:
-        db.close()
-        raise HTTPException(status_code=404, detail="Chat thread not found")
+    route = _get_thread_route(db, thread_id)
+    db.close()
 
-    _assert_thread_access(thread, username)
+    _assert_thread_access(route, username)
     if payload.sender_username != username:
-        db.close()
         raise HTTPException(status_code=403, detail="Sender does not match authenticated username")
 
-    if payload.sender_username not in [thread.owner_username, thread.participant_username]:
-        db.close()
+    if payload.sender_username not in [route.owner_username, route.participant_username]:
         raise HTTPException(status_code=403, detail="Not authorized to send to this chat thread")
 
+    chat_db = chat_store.session(route.shard)
+    thread = chat_db.query(ChatThread).filter(ChatThread.id == thread_id).first()
+    if not thread:
+        chat_db.close()
+        raise HTTPException(status_code=404, detail="Chat thread not found")
+
+    # A new message brings a compacted thread back into chat_messages.
+    chat_cold_storage.rehydrate_thread(chat_db, thread_id)
+    sender_state = _get_or_create_read_state(chat_db, thread_id, payload.sender_username)
+    now = datetime.utcnow()
     message = ChatMessage(
+        id=chat_store.next_message_id(chat_db, route.shard),
         thread_id=thread_id,
         sender_username=payload.sender_username,
-        content=payload.content.strip()
+        content=payload.content.strip(),
+        created_at=now
     )
-    db.add(message)
-    thread.updated_at = datetime.utcnow()
-    db.commit()
-    db.refresh(message)
-    sender_state = _get_or_create_read_state(db, thread_id, payload.sender_username)
+    chat_db.add(message)
+    thread.updated_at = now
     sender_state.last_read_message_id = message.id
-    sender_state.updated_at = datetime.utcnow()
-    db.commit()
+    sender_state.updated_at = now
+    chat_db.flush()
+    chat_search.index_message(chat_db, message)
+    chat_db.commit()
 
     result = {
         "id": message.id,
@@ -798,5 +1475,61 @@ def send_chat_message(thread_id: int, username: str, payload: ChatMessageCreate)
         "content": message.content,
         "created_at": message.created_at.isoformat() if message.created_at else None,
     }
+    chat_db.close()
+    return result
+
+# ========== SESSION ENDPOINTS ==========
+
+def _run_with_session(loader):
+    db = SessionLocal()
+    try:
+        return loader(db)
+    finally:
+        db.close()
+
+def _bootstrap_chat_threads(db, username: str):
+    high_water_mark = change_feed.settled_mark()
+    return {"items": _user_chat_threads(db, username), "high_water_mark": high_water_mark}
+
+@app.get("/session/bootstrap", dependencies=[Depends(rate_limiter.dependency("browse"))])
+def get_session_bootstrap(
+    username: str,
+    fields: Optional[str] = Query(None, description="Comma-separated sections to return; defaults to all of them"),
+    per_page: int = Query(20, ge=1, le=200, description="Page size for own_listings and listings"),
+):
+    """Everything the app loads right after login in one round-trip.
+
+    Sections: `admin` (like /admin/check), `own_listings` and `listings` (first page of
+    /listings for the user and for the public), `donation_history` and `chat_threads`
+    (as /chat/threads?since=0). The user is looked up once; the other sections don't
+    depend on each other, so each runs on its own pooled connection and the response
+    takes about as long as the slowest one.
+    """
+    sections = BOOTSTRAP_SECTIONS
+    if fields:
+        sections = tuple(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+        unknown = [name for name in sections if name not in BOOTSTRAP_SECTIONS]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown bootstrap fields: {', '.join(unknown)}")
+
+    db = SessionLocal()
+    user = db.query(User).filter(User.username == username).first()
     db.close()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    loaders = {
+        "own_listings": lambda db: _listing_page(db, _visible_listings(db, username), 1, per_page),
+        "listings": lambda db: _listing_page(db, _visible_listings(db), 1, per_page),
+        "donation_history": lambda db: _donation_history(db, username),
+        "chat_threads": lambda db: _bootstrap_chat_threads(db, username),
+    }
+    futures = {
+        name: bootstrap_executor.submit(_run_with_session, loaders[name])
+        for name in sections if name in loaders
+    }
+
+    result = {"username": user.username}
+    for name in sections:
+        result[name] = {"is_admin": user.is_admin} if name == "admin" else futures[name].result()
     return result
@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+"""
+Background maintenance for devicelink.db.
+
+MaintenanceScheduler runs inside the backend's event loop. Every worker starts
+one, but only the worker holding the `maintenance` lease row in
+scheduler_leases runs jobs, so multi-worker deployments don't duplicate work.
+Jobs work in small chunks, each in its own short transaction, and every run is
+recorded in maintenance_runs. A job is due once its interval has passed since
+its last recorded run, whichever process ran it.
+
+Run `python maintenance.py enable-incremental-vacuum` once (backend stopped) to
+switch devicelink.db and every existing chat shard to auto_vacuum=INCREMENTAL;
+until then the vacuum jobs only run ANALYZE on them. Shards created after this
+change start out incremental.
+"""
+
+import asyncio
+import glob
+import json
+import os
+import socket
+import sys
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import create_engine, text
+
+import change_feed
+
+LEASE_NAME = "maintenance"
+LEASE_TTL_SECONDS = 90
+TICK_SECONDS = 30
+CHUNK_SIZE = 500
+CHUNK_PAUSE_SECONDS = 0.01
+STALE_PENDING_DAYS = 30
+INCREMENTAL_VACUUM_PAGES = 500
+RUN_HISTORY_LIMIT = 200
+
+
+def ensure_maintenance_tables(engine):
+    with engine.begin() as connection:
+        connection.execute(text(
+            "CREATE TABLE IF NOT EXISTS scheduler_leases ("
+            " name VARCHAR PRIMARY KEY,"
+            " holder VARCHAR NOT NULL,"
+            " expires_at FLOAT NOT NULL)"
+        ))
+        connection.execute(text(
+            "CREATE TABLE IF NOT EXISTS maintenance_runs ("
+            " id INTEGER PRIMARY KEY,"
+            " job VARCHAR NOT NULL,"
+            " started_at DATETIME NOT NULL,"
+            " duration_ms FLOAT NOT NULL,"
+            " metrics TEXT,"
+            " error TEXT)"
+        ))
+        connection.execute(text("CREATE INDEX IF NOT EXISTS ix_maintenance_runs_job ON maintenance_runs (job, id)"))
+
+
+def chunked(engine, select_sql: str, apply: Callable, params: Optional[dict] = None, chunk_size: int = CHUNK_SIZE):
+    """Repeatedly select up to `chunk_size` ids and hand them to `apply` in one transaction.
+
+    `select_sql` gets `:limit` and `:after_id`, the last id of the previous chunk
+    (0 at first), for selects that leave rows behind and would otherwise rescan them.
+    """
+    total = 0
+    chunks = 0
+    after_id = 0
+    while True:
+        with engine.begin() as connection:
+            ids = [row[0] for row in connection.execute(
+                text(select_sql), dict(params or {}, limit=chunk_size, after_id=after_id)
+            )]
+            if not ids:
+                break
+            apply(connection, ids)
+        total += len(ids)
+        chunks += 1
+        if len(ids) < chunk_size:
+            break
+        after_id = ids[-1]
+        time.sleep(CHUNK_PAUSE_SECONDS)
+    return total, chunks
+
+
+def in_clause(ids: List[int]):
+    placeholders = ", ".join(f":id{i}" for i in range(len(ids)))
+    return placeholders, {f"id{i}": value for i, value in enumerate(ids)}
+
+
+def expire_stale_listings(engine) -> Dict:
+    cutoff = datetime.utcnow() - timedelta(days=STALE_PENDING_DAYS)
+
+    def apply(connection, ids):
+        placeholders, params = in_clause(ids)
+        last_seq = change_feed.next_change_seq(connection, len(ids))
+        connection.execute(
+            text("UPDATE listings SET status = 'EXPIRED', change_seq = :seq WHERE id = :id"),
+            [{"seq": last_seq - len(ids) + n, "id": listing_id} for n, listing_id in enumerate(ids, 1)],
+        )
+        connection.execute(
+            text(
+                "INSERT INTO activity_logs (action, username, details, created_at) "
+                f"SELECT 'listing_expired', owner, 'Listing ''' || title || ''' expired while pending', :now "
+                f"FROM listings WHERE id IN ({placeholders})"
+            ),
+            dict(params, now=datetime.utcnow().isoformat(sep=" ")),
+        )
+
+    expired, chunks = chunked(
+        engine,
+        "SELECT id FROM listings WHERE status = 'PENDING' AND created_at < :cutoff ORDER BY id LIMIT :limit",
+        apply,
+        {"cutoff": cutoff.isoformat(sep=" ")},
+    )
+    return {"listings_expired": expired, "chunks": chunks}
+
+
+def clean_orphaned_saved_search_matches(engine) -> Dict:
+    def apply(connection, ids):
+        placeholders, params = in_clause(ids)
+        connection.execute(text(f"DELETE FROM saved_search_matches WHERE id IN ({placeholders})"), params)
+
+    matches, chunks = chunked(
+        engine,
+        "SELECT m.id FROM saved_search_matches m LEFT JOIN listings l ON l.id = m.listing_id "
+        "WHERE l.id IS NULL ORDER BY m.id LIMIT :limit",
+        apply,
+    )
+    return {"saved_search_matches_deleted": matches, "chunks": chunks}
+
+
+def incremental_vacuum(engine, max_pages: Optional[int] = None) -> int:
+    """Return free pages to the filesystem, INCREMENTAL_VACUUM_PAGES per transaction.
+
+    Only databases created with auto_vacuum=INCREMENTAL can do this; on others
+    it releases nothing. Returns the number of pages released.
+    """
+    released = 0
+    with engine.connect() as connection:
+        if connection.execute(text("PRAGMA auto_vacuum")).scalar() != 2:
+            return 0
+        while max_pages is None or released < max_pages:
+            step = INCREMENTAL_VACUUM_PAGES if max_pages is None else min(INCREMENTAL_VACUUM_PAGES, max_pages - released)
+            pages = min(connection.execute(text("PRAGMA freelist_count")).scalar(), step)
+            if not pages:
+                break
+            # incremental_vacuum frees one page per step and pysqlite only steps a
+            # row-less statement once, so issue it once per page to release.
+            for _ in range(pages):
+                connection.execute(text("PRAGMA incremental_vacuum(1)"))
+            connection.commit()
+            released += pages
+            time.sleep(CHUNK_PAUSE_SECONDS)
+    return released
+
+
+def analyze_and_vacuum(engine) -> Dict:
+    with engine.connect() as connection:
+        freelist_before = connection.execute(text("PRAGMA freelist_count")).scalar()
+        connection.execute(text("ANALYZE"))
+        auto_vacuum = connection.execute(text("PRAGMA auto_vacuum")).scalar()
+        connection.commit()
+    incremental_vacuum(engine, INCREMENTAL_VACUUM_PAGES)
+    with engine.connect() as connection:
+        freelist_after = connection.execute(text("PRAGMA freelist_count")).scalar()
+    return {
+        "analyzed": True,
+        "incremental_vacuum": auto_vacuum == 2,
+        "freelist_pages_before": freelist_before,
+        "freelist_pages_after": freelist_after,
+    }
+
+
+@dataclass
+class MaintenanceJob:
+    name: str
+    run: Callable
+    interval_seconds: float
+
+
+DEFAULT_JOBS = [
+    ("expire_stale_listings", expire_stale_listings, 60 * 60),
+    ("clean_orphaned_saved_search_matches", clean_orphaned_saved_search_matches, 60 * 60),
+    ("analyze_and_vacuum", analyze_and_vacuum, 24 * 60 * 60),
+]
+
+
+class MaintenanceScheduler:
+    def __init__(self, engine, jobs=DEFAULT_JOBS, tick_seconds: float = TICK_SECONDS):
+        self.engine = engine
+        self.jobs = [MaintenanceJob(name, run, interval) for name, run, interval in jobs]
+        self.tick_seconds = tick_seconds
+        self.holder = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.is_leader = False
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._loop())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await asyncio.to_thread(self._release_lease)
+
+    def _acquire_lease(self) -> bool:
+        now = time.time()
+        with self.engine.begin() as connection:
+            connection.execute(
+                text(
+                    "INSERT INTO scheduler_leases (name, holder, expires_at) VALUES (:name, :holder, :expires) "
+                    "ON CONFLICT(name) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at "
+                    "WHERE scheduler_leases.holder = :holder OR scheduler_leases.expires_at < :now"
+                ),
+                {"name": LEASE_NAME, "holder": self.holder, "expires": now + LEASE_TTL_SECONDS, "now": now},
+            )
+            holder = connection.execute(
+                text("SELECT holder FROM scheduler_leases WHERE name = :name"), {"name": LEASE_NAME}
+            ).scalar()
+        return holder == self.holder
+
+    def _release_lease(self):
+        with self.engine.begin() as connection:
+            connection.execute(
+                text("DELETE FROM scheduler_leases WHERE name = :name AND holder = :holder"),
+                {"name": LEASE_NAME, "holder": self.holder},
+            )
+        self.is_leader = False
+
+    def run_job(self, job: MaintenanceJob) -> Dict:
+        started_at = datetime.utcnow()
+        started = time.perf_counter()
+        metrics, error = None, None
+        try:
+            metrics = job.run(self.engine)
+        except Exception as exc:
+            error = f"{type(exc).__name__}: {exc}"
+        duration_ms = round((time.perf_counter() - started) * 1000, 2)
+        with self.engine.begin() as connection:
+            connection.execute(
+                text(
+                    "INSERT INTO maintenance_runs (job, started_at, duration_ms, metrics, error) "
+                    "VALUES (:job, :started_at, :duration_ms, :metrics, :error)"
+                ),
+                {
+                    "job": job.name,
+                    "started_at": started_at.isoformat(sep=" "),
+                    "duration_ms": duration_ms,
+                    "metrics": json.dumps(metrics) if metrics is not None else None,
+                    "error": error,
+                },
+            )
+            connection.execute(
+                # Always keep each job's latest run: the scheduler works out when it is due from it.
+                text(
+                    "DELETE FROM maintenance_runs WHERE id <= "
+                    "(SELECT id FROM maintenance_runs ORDER BY id DESC LIMIT 1 OFFSET :keep) "
+                    "AND id NOT IN (SELECT MAX(id) FROM maintenance_runs GROUP BY job)"
+                ),
+                {"keep": RUN_HISTORY_LIMIT},
+            )
+        return {"job": job.name, "duration_ms": duration_ms, "metrics": metrics, "error": error}
+
+    async def _run_with_heartbeat(self, job: MaintenanceJob) -> Dict:
+        # Keep renewing the lease while a long job runs so it can't expire under it.
+        run = asyncio.ensure_future(asyncio.to_thread(self.run_job, job))
+        while not run.done():
+            await asyncio.wait({run}, timeout=LEASE_TTL_SECONDS / 3)
+            if not run.done() and self.is_leader:
+                try:
+                    self.is_leader = await asyncio.to_thread(self._acquire_lease)
+                except Exception:
+                    # Retried on the next heartbeat; the check before the next job catches a lost lease.
+                    pass
+        return run.result()
+
+    async def _tick(self):
+        self.is_leader = await asyncio.to_thread(self._acquire_lease)
+        if not self.is_leader:
+            return
+        # Due times come from the recorded runs, so restarts and lease handovers
+        # don't rerun jobs that another process ran recently.
+        last_started = await asyncio.to_thread(last_run_times, self.engine)
+        for job in self.jobs:
+            if not self.is_leader:
+                return
+            started_at = last_started.get(job.name)
+            if started_at is not None and started_at + timedelta(seconds=job.interval_seconds) > datetime.utcnow():
+                continue
+            # Earlier jobs in this tick may have outlasted the lease, so confirm it is still ours.
+            self.is_leader = await asyncio.to_thread(self._acquire_lease)
+            if not self.is_leader:
+                return
+            await self._run_with_heartbeat(job)
+
+    async def _loop(self):
+        while True:
+            try:
+                await self._tick()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # A locked database or similar transient failure; try again next tick.
+                self.is_leader = False
+            await asyncio.sleep(self.tick_seconds)
+
+
+RUN_COLUMNS = "id, job, started_at, duration_ms, metrics, error"
+
+
+def _run_to_dict(row) -> Dict:
+    return {
+        "id": row[0],
+        "job": row[1],
+        "started_at": row[2],
+        "duration_ms": row[3],
+        "metrics": json.loads(row[4]) if row[4] else None,
+        "error": row[5],
+    }
+
+
+def recent_runs(engine, limit: int = 50):
+    with engine.connect() as connection:
+        rows = connection.execute(
+            text(f"SELECT {RUN_COLUMNS} FROM maintenance_runs ORDER BY id DESC LIMIT :limit"),
+            {"limit": limit},
+        ).fetchall()
+    return [_run_to_dict(row) for row in rows]
+
+
+def last_run_times(engine) -> Dict[str, datetime]:
+    """When each job's most recent run started."""
+    with engine.connect() as connection:
+        rows = connection.execute(text("SELECT job, MAX(started_at) FROM maintenance_runs GROUP BY job")).fetchall()
+    return {job: datetime.fromisoformat(started_at) for job, started_at in rows}
+
+
+def last_run(engine, job: str) -> Optional[Dict]:
+    with engine.connect() as connection:
+        row = connection.execute(
+            text(f"SELECT {RUN_COLUMNS} FROM maintenance_runs WHERE job = :job ORDER BY id DESC LIMIT 1"),
+            {"job": job},
+        ).fetchone()
+    return _run_to_dict(row) if row is not None else None
+
+
+def enable_incremental_vacuum(database_path: str = "./devicelink.db"):
+    """Switch one database file to auto_vacuum=INCREMENTAL (rewrites it with VACUUM)."""
+    engine = create_engine(f"sqlite:///{database_path}")
+    with engine.connect() as connection:
+        connection.execute(text("PRAGMA auto_vacuum = INCREMENTAL"))
+        connection.execute(text("VACUUM"))
+        mode = connection.execute(text("PRAGMA auto_vacuum")).scalar()
+    engine.dispose()
+    return mode
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] != "enable-incremental-vacuum":
+        print(__doc__)
+        sys.exit(1)
+    paths = ["./devicelink.db"] + sorted(glob.glob(os.path.join("./chat_shards", "chat-*.db")))
+    for path in paths:
+        mode = enable_incremental_vacuum(path)
+        print(f"✓ {path}: auto_vacuum is now {mode} (2 = INCREMENTAL)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+import math
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from fastapi import HTTPException, Request
+from starlette.concurrency import run_in_threadpool
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    rate: float  # tokens refilled per second
+    capacity: float  # burst size
+
+    @property
+    def emission_interval(self) -> float:
+        return 1.0 / self.rate
+
+
+# Limits per endpoint class, applied per client (see client_identity).
+ENDPOINT_LIMITS: Dict[str, RateLimit] = {
+    "auth": RateLimit(rate=10 / 60, capacity=10),
+    "browse": RateLimit(rate=5, capacity=20),
+    "chat_poll": RateLimit(rate=2, capacity=10),
+    "chat_send": RateLimit(rate=1, capacity=10),
+}
+
+
+class InMemoryBackend:
+    """Token buckets stored as a single float per key (GCRA).
+
+    Each key holds its "theoretical arrival time": the moment the bucket will be
+    full again. A request is admitted if pushing that time forward by its cost
+    stays within the burst window. Keys whose time has passed are exactly
+    equivalent to a fresh bucket, so the periodic sweep drops them.
+    """
+
+    blocking = False
+
+    def __init__(self, sweep_interval: float = 60.0):
+        self.sweep_interval = sweep_interval
+        self._lock = threading.Lock()
+        self._tat: Dict[str, float] = {}
+        self._next_sweep = time.monotonic() + sweep_interval
+
+    def __len__(self):
+        return len(self._tat)
+
+    def acquire(self, key: str, limit: RateLimit, cost: float = 1.0, now: Optional[float] = None) -> Tuple[bool, float]:
+        if now is None:
+            now = time.monotonic()
+        interval = limit.emission_interval
+        with self._lock:
+            tat = self._tat.get(key, now)
+            if tat < now:
+                tat = now
+            new_tat = tat + cost * interval
+            excess = new_tat - now - limit.capacity * interval
+            if excess > 0:
+                allowed = False
+                retry_after = excess
+            else:
+                self._tat[key] = new_tat
+                allowed = True
+                retry_after = 0.0
+            if now >= self._next_sweep:
+                self._sweep(now)
+        return allowed, retry_after
+
+    def _sweep(self, now: float):
+        idle = [key for key, tat in self._tat.items() if tat <= now]
+        for key in idle:
+            del self._tat[key]
+        self._next_sweep = now + self.sweep_interval
+
+
+class RedisBackend:
+    """Shares buckets between workers through Redis (requires the `redis` package).
+
+    Same algorithm as InMemoryBackend, run atomically in a Lua script; each key
+    expires once its bucket would be full again.
+    """
+
+    blocking = True
+
+    _SCRIPT = """
+    local now = tonumber(ARGV[1])
+    local interval = tonumber(ARGV[2])
+    local capacity = tonumber(ARGV[3])
+    local cost = tonumber(ARGV[4])
+    local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+    if tat < now then tat = now end
+    local new_tat = tat + cost * interval
+    local excess = new_tat - now - capacity * interval
+    if excess > 0 then
+        return {0, tostring(excess)}
+    end
+    redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000))
+    return {1, '0'}
+    """
+
+    def __init__(self, url: str, prefix: str = "devicelink:ratelimit:"):
+        try:
+            import redis
+        except ImportError as exc:
+            raise RuntimeError("RedisBackend needs the 'redis' package: pip install redis") from exc
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url)
+        self._script = self._client.register_script(self._SCRIPT)
+
+    def acquire(self, key: str, limit: RateLimit, cost: float = 1.0, now: Optional[float] = None) -> Tuple[bool, float]:
+        if now is None:
+            now = time.time()
+        allowed, retry_after = self._script(
+            keys=[self.prefix + key],
+            args=[now, limit.emission_interval, limit.capacity, cost],
+        )
+        return bool(allowed), float(retry_after)
+
+
+def client_identity(request: Request) -> str:
+    """The key a request is limited under.
+
+    Requests are not authenticated yet and every username in them is supplied
+    by the caller, so keying on one would let anyone drain another user's
+    bucket, or dodge a limit by making up names. Until there is a verified
+    user to key on, it is the client address. Behind a reverse proxy, run
+    uvicorn with --proxy-headers and --forwarded-allow-ips so this is the real
+    client and not the proxy.
+    """
+    return f"ip:{request.client.host if request.client else 'unknown'}"
+
+
+def _default_backend():
+    redis_url = os.environ.get("DEVICELINK_RATE_LIMIT_REDIS_URL")
+    if redis_url:
+        return RedisBackend(redis_url)
+    return InMemoryBackend()
+
+
+class RateLimiter:
+    def __init__(self, limits: Dict[str, RateLimit] = ENDPOINT_LIMITS, backend=None):
+        self.limits = dict(limits)
+        self.backend = backend if backend is not None else _default_backend()
+        self.enabled = True
+
+    def check(self, endpoint_class: str, identity: str):
+        if not self.enabled:
+            return
+        limit = self.limits[endpoint_class]
+        allowed, retry_after = self.backend.acquire(f"{endpoint_class}:{identity}", limit)
+        if not allowed:
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests, please slow down",
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+            )
+
+    def dependency(self, endpoint_class: str):
+        if endpoint_class not in self.limits:
+            raise KeyError(f"No rate limit configured for endpoint class '{endpoint_class}'")
+
+        # Async so FastAPI runs it on the event loop: a request that is going to
+        # be rejected shouldn't have to wait for a threadpool slot first.
+        async def limit_request(request: Request):
+            identity = client_identity(request)
+            if getattr(self.backend, "blocking", False):
+                await run_in_threadpool(self.check, endpoint_class, identity)
+            else:
+                self.check(endpoint_class, identity)
+
+        return limit_request
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Chat Shard Rebalancing Script
+Moves chat threads still stored in devicelink.db into the chat shards, and moves
+threads between shards after the shard count changes. Stop the backend before
+running it.
+
+Usage:
+    python rebalance_chat_shards.py [shard-count]
+
+After rebalancing to a new count, set CHAT_SHARD_COUNT in chat_shards.py to the
+same number before restarting the backend.
+"""
+
+import sys
+
+import chat_shards
+from main import ChatBase, engine
+
+
+def main():
+    shard_count = int(sys.argv[1]) if len(sys.argv) > 1 else chat_shards.CHAT_SHARD_COUNT
+
+    print("=" * 50)
+    print("DeviceLink Chat Shard Rebalancing")
+    print("=" * 50)
+
+    store = chat_shards.ChatShardStore(ChatBase.metadata, shard_count=shard_count)
+    migrated = store.migrate_legacy(engine)
+    if migrated["threads"]:
+        print(f"\n✓ Moved {migrated['threads']} legacy threads ({migrated['messages']} messages) into shards")
+
+    result = store.rebalance(engine)
+    print(f"\n✓ Moved {result['threads_moved']} threads to match {shard_count} shards")
+    if result["missing_shards"]:
+        print(f"✗ Routes point at missing shard files: {result['missing_shards']}")
+        sys.exit(1)
+
+    if shard_count != chat_shards.CHAT_SHARD_COUNT:
+        print(f"\nSet CHAT_SHARD_COUNT = {shard_count} in chat_shards.py before restarting the backend.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+import re
+import threading
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: Optional[str]) -> Set[str]:
+    if not text:
+        return set()
+    return set(TOKEN_PATTERN.findall(text.lower()))
+
+
+@dataclass(frozen=True)
+class SavedSearchEntry:
+    id: int
+    username: str
+    keywords: FrozenSet[str]
+    category: Optional[str] = None
+    condition: Optional[str] = None
+    min_quantity: Optional[int] = None
+    max_quantity: Optional[int] = None
+
+    def matches(self, tokens: Set[str], category, condition, quantity) -> bool:
+        if self.category is not None and self.category != category:
+            return False
+        if self.condition is not None and self.condition != condition:
+            return False
+        if self.min_quantity is not None and (quantity is None or quantity < self.min_quantity):
+            return False
+        if self.max_quantity is not None and (quantity is None or quantity > self.max_quantity):
+            return False
+        return self.keywords.issubset(tokens)
+
+
+class SavedSearchIndex:
+    """In-memory inverted index from listing tokens and facets to saved searches.
+
+    Each saved search is posted under one key: its longest keyword (or None when
+    it has no keywords) together with its category and condition filters.
+    Within a key, searches are grouped by their (min_quantity, max_quantity)
+    range. Matching a listing looks up its own tokens (plus None) combined with
+    its category and condition, or with no filter on either, checks each
+    distinct quantity range once, and only verifies the remaining keywords of
+    searches that survive. The cost scales with the listing size, the number of
+    distinct quantity ranges and the number of matches rather than with the
+    number of saved searches.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: Dict[int, SavedSearchEntry] = {}
+        self._postings: Dict[tuple, Dict[tuple, Dict[int, SavedSearchEntry]]] = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def _keys(entry: SavedSearchEntry):
+        anchor = max(entry.keywords, key=lambda token: (len(token), token)) if entry.keywords else None
+        return (anchor, entry.category, entry.condition), (entry.min_quantity, entry.max_quantity)
+
+    def add(self, entry: SavedSearchEntry):
+        with self._lock:
+            self._remove_locked(entry.id)
+            self._entries[entry.id] = entry
+            posting_key, quantity_key = self._keys(entry)
+            groups = self._postings.setdefault(posting_key, {})
+            groups.setdefault(quantity_key, {})[entry.id] = entry
+
+    def remove(self, search_id: int):
+        with self._lock:
+            self._remove_locked(search_id)
+
+    def _remove_locked(self, search_id: int):
+        entry = self._entries.pop(search_id, None)
+        if entry is None:
+            return
+        posting_key, quantity_key = self._keys(entry)
+        groups = self._postings.get(posting_key)
+        if groups is None or quantity_key not in groups:
+            return
+        groups[quantity_key].pop(search_id, None)
+        if not groups[quantity_key]:
+            del groups[quantity_key]
+            if not groups:
+                del self._postings[posting_key]
+
+    def rebuild(self, entries: Iterable[SavedSearchEntry]):
+        with self._lock:
+            self._entries.clear()
+            self._postings.clear()
+        for entry in entries:
+            self.add(entry)
+
+    def match(self, title, description, category, condition, quantity) -> List[SavedSearchEntry]:
+        tokens = tokenize(title) | tokenize(description)
+        facets = {(category, condition), (category, None), (None, condition), (None, None)}
+        matched: List[SavedSearchEntry] = []
+        with self._lock:
+            for anchor in [None, *tokens]:
+                for facet_category, facet_condition in facets:
+                    groups = self._postings.get((anchor, facet_category, facet_condition))
+                    if not groups:
+                        continue
+                    for (min_quantity, max_quantity), group in groups.items():
+                        if min_quantity is not None and (quantity is None or quantity < min_quantity):
+                            continue
+                        if max_quantity is not None and (quantity is None or quantity > max_quantity):
+                            continue
+                        if anchor is None:
+                            matched.extend(group.values())
+                        else:
+                            matched.extend(entry for entry in group.values() if entry.keywords <= tokens)
+        return matched
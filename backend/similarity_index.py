@@ -0,0 +1,262 @@
+import math
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+
+from saved_search_index import TOKEN_PATTERN
+
+
+def listing_tokens(title, description, category, condition) -> List[str]:
+    tokens = TOKEN_PATTERN.findall(f"{title or ''} {description or ''}".lower())
+    if category:
+        tokens.append(f"category:{category.lower()}")
+    if condition:
+        tokens.append(f"condition:{condition.lower()}")
+    return tokens
+
+
+class ListingSimilarityIndex:
+    """TF-IDF cosine-similarity index over active listings.
+
+    Top-k neighbours for every listing are precomputed with batched sparse
+    matrix products, so serving a lookup is a dict access. Approvals, completions
+    and deletions patch the matrix and the affected neighbour lists in place.
+    Incremental vectors can only use the vocabulary of the last build, so the
+    whole index is rebuilt on a background thread once enough changes pile up
+    or once more than `oov_ratio` of the tokens added since the last build
+    were unknown to it (measured over at least `oov_min_tokens` tokens).
+    """
+
+    def __init__(
+        self,
+        top_k: int = 10,
+        batch_size: int = 256,
+        rebuild_ratio: float = 0.25,
+        oov_ratio: float = 0.05,
+        oov_min_tokens: int = 200,
+    ):
+        self.top_k = top_k
+        self.batch_size = batch_size
+        self.rebuild_ratio = rebuild_ratio
+        self.oov_ratio = oov_ratio
+        self.oov_min_tokens = oov_min_tokens
+        self._lock = threading.RLock()
+        self._docs: Dict[int, List[str]] = {}
+        self._tombstones = set()
+        self._ready = False
+        self._building = False
+        self._dirty = 0
+        self._added_tokens = 0
+        self._oov_tokens = 0
+        self._vocab: Dict[str, int] = {}
+        self._idf = np.zeros(0)
+        self._matrix = sparse.csr_matrix((0, 0))
+        self._ids: List[int] = []
+        self._rows: Dict[int, int] = {}
+        self._alive = np.zeros(0, dtype=bool)
+        self._neighbors: Dict[int, List[Tuple[float, int]]] = {}
+        self._referenced_by: Dict[int, set] = {}
+
+    @property
+    def ready(self) -> bool:
+        return self._ready
+
+    def similar(self, listing_id: int, limit: Optional[int] = None) -> List[int]:
+        neighbors = self._neighbors.get(listing_id, ())
+        return [other for _, other in neighbors[:limit]]
+
+    # ----- building -----
+
+    def load(self, docs: Iterable[Tuple[int, List[str]]]):
+        with self._lock:
+            for listing_id, tokens in docs:
+                if listing_id not in self._tombstones and listing_id not in self._docs:
+                    self._docs[listing_id] = tokens
+            self._tombstones.clear()
+        self.rebuild()
+
+    def start_background_build(self, loader):
+        thread = threading.Thread(target=lambda: self.load(loader()), name="similarity-index", daemon=True)
+        thread.start()
+        return thread
+
+    def rebuild(self):
+        with self._lock:
+            if self._building:
+                return
+            self._building = True
+            snapshot = dict(self._docs)
+        try:
+            state = self._compute(snapshot)
+            with self._lock:
+                (self._vocab, self._idf, self._matrix, self._ids, self._rows,
+                 self._alive, neighbors) = state
+                self._neighbors = {}
+                self._referenced_by = {}
+                for listing_id, neighbor_list in neighbors.items():
+                    self._set_neighbors(listing_id, neighbor_list)
+                self._dirty = 0
+                self._added_tokens = 0
+                self._oov_tokens = 0
+                self._ready = True
+                # Replay mutations that landed while the matrix was being computed.
+                for listing_id in list(snapshot):
+                    if listing_id not in self._docs:
+                        self._remove_locked(listing_id)
+                for listing_id, tokens in self._docs.items():
+                    if snapshot.get(listing_id) is not tokens:
+                        self._add_locked(listing_id, tokens)
+        finally:
+            with self._lock:
+                self._building = False
+
+    def _compute(self, docs: Dict[int, List[str]]):
+        ids = list(docs)
+        counts = [Counter(docs[listing_id]) for listing_id in ids]
+        document_frequency = Counter()
+        for count in counts:
+            document_frequency.update(count.keys())
+        vocab = {token: column for column, token in enumerate(sorted(document_frequency))}
+        n_docs = len(ids)
+        idf = np.ones(len(vocab))
+        for token, column in vocab.items():
+            idf[column] = math.log((1 + n_docs) / (1 + document_frequency[token])) + 1
+
+        matrix = self._vectorize(counts, vocab, idf)
+        alive = np.ones(n_docs, dtype=bool)
+        rows = {listing_id: row for row, listing_id in enumerate(ids)}
+        neighbors = self._top_k_rows(matrix, alive, ids, range(n_docs))
+        return vocab, idf, matrix, ids, rows, alive, neighbors
+
+    @staticmethod
+    def _vectorize(counts: List[Counter], vocab: Dict[str, int], idf: np.ndarray):
+        row_indices = []
+        columns = []
+        values = []
+        for row, count in enumerate(counts):
+            for token, tf in count.items():
+                column = vocab.get(token)
+                if column is not None:
+                    row_indices.append(row)
+                    columns.append(column)
+                    values.append((1 + math.log(tf)) * idf[column])
+        matrix = sparse.csr_matrix(
+            (
+                np.asarray(values, dtype=np.float64),
+                (np.asarray(row_indices, dtype=np.int64), np.asarray(columns, dtype=np.int64)),
+            ),
+            shape=(len(counts), len(vocab)),
+        )
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        norms[norms == 0] = 1.0
+        return sparse.csr_matrix(sparse.diags(1.0 / norms) @ matrix)
+
+    def _pick(self, scores: np.ndarray, ids: List[int]) -> List[Tuple[float, int]]:
+        k = min(self.top_k, len(scores))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        picked = [(float(scores[column]), ids[column]) for column in top if scores[column] > 0]
+        picked.sort(reverse=True)
+        return picked
+
+    def _top_k_rows(self, matrix, alive, ids, rows) -> Dict[int, List[Tuple[float, int]]]:
+        rows = np.fromiter(rows, dtype=np.int64)
+        result = {}
+        if len(rows) == 0:
+            return result
+        transposed = matrix.T.tocsc()
+        for start in range(0, len(rows), self.batch_size):
+            batch = rows[start:start + self.batch_size]
+            scores = (matrix[batch] @ transposed).toarray()
+            scores[:, ~alive] = 0.0
+            scores[np.arange(len(batch)), batch] = 0.0
+            for offset, row in enumerate(batch):
+                result[ids[row]] = self._pick(scores[offset], ids)
+        return result
+
+    # ----- incremental updates -----
+
+    def upsert(self, listing_id: int, tokens: List[str]):
+        with self._lock:
+            self._docs[listing_id] = tokens
+            self._tombstones.discard(listing_id)
+            if self._ready and not self._building:
+                self._add_locked(listing_id, tokens)
+                self._added_tokens += len(tokens)
+                self._oov_tokens += sum(1 for token in tokens if token not in self._vocab)
+                self._after_change()
+
+    def remove(self, listing_id: int):
+        with self._lock:
+            self._docs.pop(listing_id, None)
+            if not self._ready:
+                self._tombstones.add(listing_id)
+                return
+            if self._building or listing_id not in self._rows:
+                return
+            self._remove_locked(listing_id)
+            self._after_change()
+
+    def _after_change(self):
+        self._dirty += 1
+        too_many_changes = self._dirty > max(1, len(self._docs)) * self.rebuild_ratio
+        too_many_unknown = (
+            self._added_tokens >= self.oov_min_tokens
+            and self._oov_tokens > self._added_tokens * self.oov_ratio
+        )
+        if too_many_changes or too_many_unknown:
+            self._dirty = 0
+            self._added_tokens = 0
+            self._oov_tokens = 0
+            threading.Thread(target=self.rebuild, name="similarity-index", daemon=True).start()
+
+    def _set_neighbors(self, listing_id: int, neighbor_list: List[Tuple[float, int]]):
+        for _, other in self._neighbors.get(listing_id, ()):
+            referrers = self._referenced_by.get(other)
+            if referrers is not None:
+                referrers.discard(listing_id)
+        self._neighbors[listing_id] = neighbor_list
+        for _, other in neighbor_list:
+            self._referenced_by.setdefault(other, set()).add(listing_id)
+
+    def _add_locked(self, listing_id: int, tokens: List[str]):
+        if listing_id in self._rows:
+            self._remove_locked(listing_id)
+        vector = self._vectorize([Counter(tokens)], self._vocab, self._idf)
+        row = len(self._ids)
+        self._matrix = sparse.vstack([self._matrix, vector], format="csr")
+        self._ids.append(listing_id)
+        self._rows[listing_id] = row
+        self._alive = np.append(self._alive, True)
+
+        scores = (self._matrix @ vector.T).toarray().ravel()
+        scores[~self._alive] = 0.0
+        scores[row] = 0.0
+        self._set_neighbors(listing_id, self._pick(scores, self._ids))
+
+        for other_row in np.nonzero(scores > 0)[0]:
+            other = self._ids[other_row]
+            score = float(scores[other_row])
+            current = self._neighbors.get(other, [])
+            if len(current) < self.top_k or score > current[-1][0]:
+                updated = sorted(current + [(score, listing_id)], reverse=True)[:self.top_k]
+                self._set_neighbors(other, updated)
+
+    def _remove_locked(self, listing_id: int):
+        row = self._rows.pop(listing_id, None)
+        if row is None:
+            return
+        self._alive[row] = False
+        self._set_neighbors(listing_id, [])
+        del self._neighbors[listing_id]
+        affected = self._referenced_by.pop(listing_id, set())
+        if affected:
+            recomputed = self._top_k_rows(
+                self._matrix, self._alive, self._ids, (self._rows[other] for other in affected)
+            )
+            for other, neighbor_list in recomputed.items():
+                self._set_neighbors(other, neighbor_list)
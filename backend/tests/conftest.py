@@ -0,0 +1,82 @@
+import os
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+
+@pytest.fixture
+def app_main(tmp_path, monkeypatch):
+    """main, reloaded against empty databases in a scratch directory."""
+    import chat_cold_storage
+    import check_query_plans
+
+    monkeypatch.setattr(chat_cold_storage, "cold_cache", chat_cold_storage.ColdThreadCache())
+    monkeypatch.chdir(tmp_path)
+    module = check_query_plans._load_app(str(tmp_path))
+    yield module
+    module.engine.dispose()
+    for engine in module.chat_store.engines:
+        engine.dispose()
+
+
+@pytest.fixture
+def client(app_main):
+    from fastapi.testclient import TestClient
+
+    db = app_main.SessionLocal()
+    db.add(app_main.User(username="admin", password="x", is_admin=True))
+    db.add_all(app_main.User(username=name, password="x") for name in ("alice", "bob", "carol"))
+    db.commit()
+    db.close()
+    return TestClient(app_main.app)
+
+
+@pytest.fixture
+def create_listing(app_main, client):
+    """Post a listing as `owner` and approve it unless approve=False; returns its id."""
+
+    def create(owner="alice", title="Dell laptop", approve=True, **fields):
+        body = {"title": title, "description": "", "category": "Laptop", "condition": "Good", "quantity": 1, "owner": owner}
+        assert client.post("/listings", json=dict(body, **fields)).status_code == 200
+        db = app_main.SessionLocal()
+        listing_id = db.query(app_main.Listing.id).order_by(app_main.Listing.id.desc()).first()[0]
+        db.close()
+        if approve:
+            response = client.post(
+                "/admin/approve-listing", params={"admin_username": "admin"},
+                json={"listing_id": listing_id, "approved": True},
+            )
+            assert response.status_code == 200
+        return listing_id
+
+    return create
+
+
+@pytest.fixture
+def open_thread(client, create_listing):
+    """Open a chat thread on a new approved listing of `owner`; returns the thread id."""
+
+    def open_(owner="alice", participant="bob", title="Dell laptop"):
+        listing_id = create_listing(owner=owner, title=title)
+        response = client.post("/chat/threads", json={"listing_id": listing_id, "username": participant})
+        assert response.status_code == 200
+        return response.json()["id"]
+
+    return open_
+
+
+@pytest.fixture
+def send_message(client):
+    def send(thread_id, sender, content):
+        response = client.post(
+            f"/chat/threads/{thread_id}/messages", params={"username": sender},
+            json={"sender_username": sender, "content": content},
+        )
+        assert response.status_code == 200
+        return response.json()
+
+    return send
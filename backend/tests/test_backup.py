@@ -0,0 +1,93 @@
+import asyncio
+import os
+import sqlite3
+import time
+
+import backup
+import maintenance
+
+
+def _make_database(path, pages):
+    connection = sqlite3.connect(path)
+    connection.execute("PRAGMA page_size = 4096")
+    connection.execute("CREATE TABLE blobs (id INTEGER PRIMARY KEY, data BLOB)")
+    connection.executemany("INSERT INTO blobs (data) VALUES (?)", [(os.urandom(3000),) for _ in range(pages)])
+    connection.commit()
+    page_count = connection.execute("PRAGMA page_count").fetchone()[0]
+    connection.close()
+    return page_count
+
+
+def test_copy_pauses_between_batches(tmp_path, monkeypatch):
+    source = str(tmp_path / "source.db")
+    page_count = _make_database(source, 1000)
+    pause = 0.02
+    pages_per_step = 100
+    steps = -(-page_count // pages_per_step)
+
+    pauses = []
+    real_sleep = time.sleep
+
+    def recording_sleep(seconds):
+        pauses.append((time.perf_counter(), seconds))
+        real_sleep(seconds)
+
+    monkeypatch.setattr(backup.time, "sleep", recording_sleep)
+    started = time.perf_counter()
+    backup._copy(source, str(tmp_path / "copy.db"), pages_per_step, pause)
+    elapsed = time.perf_counter() - started
+
+    assert len(pauses) == steps - 1
+    assert all(seconds == pause for _, seconds in pauses)
+    assert all(later - earlier >= pause for (earlier, _), (later, _) in zip(pauses, pauses[1:]))
+    assert elapsed >= (steps - 1) * pause
+
+
+def test_rotation_skips_backups_another_worker_already_removed(tmp_path, monkeypatch):
+    database = str(tmp_path / "devicelink.db")
+    backup_dir = str(tmp_path / "backups")
+    _make_database(database, 10)
+    for _ in range(3):
+        backup.create_backup(database, backup_dir, keep_last=3)
+    listed = backup.list_backups(backup_dir)
+    os.remove(listed[-1]["path"])
+    monkeypatch.setattr(backup, "list_backups", lambda *args: listed)
+
+    assert backup.rotate_backups(backup_dir, keep_last=1) == [listed[1]["name"]]
+
+
+def test_scheduled_backups_only_run_in_the_worker_holding_the_lease(app_main):
+    job = next(job for job in app_main.maintenance_scheduler.jobs if job.name == app_main.BACKUP_JOB)
+    workers = [maintenance.MaintenanceScheduler(app_main.engine, jobs=[(job.name, job.run, job.interval_seconds)])
+               for _ in range(3)]
+    for worker in workers:
+        asyncio.run(worker._tick())
+
+    assert [worker.is_leader for worker in workers] == [True, False, False]
+    prefixes = sorted(backup._backup_prefix(b["name"]) for b in backup.list_backups())
+    assert prefixes == sorted(target["prefix"] for target in app_main._backup_targets())
+    run = maintenance.last_run(app_main.engine, app_main.BACKUP_JOB)
+    assert run["error"] is None and len(run["metrics"]["backups"]) == len(prefixes)
+
+
+def test_check_backup_set_reports_route_mismatches(tmp_path):
+    main_backup = str(tmp_path / "devicelink-20260101T000000Z.db")
+    connection = sqlite3.connect(main_backup)
+    connection.execute("CREATE TABLE chat_thread_routes (id INTEGER PRIMARY KEY, shard INTEGER)")
+    connection.executemany("INSERT INTO chat_thread_routes VALUES (?, ?)", [(1, 0), (2, 1), (3, 0), (4, 1)])
+    connection.commit()
+    connection.close()
+
+    shard_backups = []
+    for shard, thread_ids in ((0, [1, 3]), (1, [2, 5])):
+        path = str(tmp_path / f"chat-{shard}-20260101T000001Z.db")
+        connection = sqlite3.connect(path)
+        connection.execute("CREATE TABLE chat_threads (id INTEGER PRIMARY KEY)")
+        connection.executemany("INSERT INTO chat_threads VALUES (?)", [(thread_id,) for thread_id in thread_ids])
+        connection.commit()
+        connection.close()
+        shard_backups.append(path)
+
+    report = backup.check_backup_set(main_backup, shard_backups)
+    assert report[0] == {"missing_threads": [], "unrouted_threads": []}
+    assert report[1] == {"missing_threads": [4], "unrouted_threads": [5]}
@@ -0,0 +1,130 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import text
+
+import chat_cold_storage
+
+
+@pytest.fixture(autouse=True)
+def one_shard(app_main, monkeypatch):
+    # Keep every thread on shard 0 so one compaction run sees all of them.
+    monkeypatch.setattr(app_main.chat_store, "shard_count", 1)
+
+
+@pytest.fixture
+def idle_thread(app_main, client, open_thread, send_message):
+    """A thread with four messages that both participants have read, idle for 90 days."""
+    thread_id = open_thread()
+    for n in range(4):
+        send_message(thread_id, "bob" if n % 2 == 0 else "alice", f"message {n}")
+    for username in ("alice", "bob"):
+        assert client.post(f"/chat/threads/{thread_id}/read", params={"username": username}).status_code == 200
+    with _shard_engine(app_main, thread_id).begin() as connection:
+        connection.execute(
+            text("UPDATE chat_threads SET updated_at = :long_ago WHERE id = :thread_id"),
+            {"long_ago": (datetime.utcnow() - timedelta(days=90)).isoformat(sep=" "), "thread_id": thread_id},
+        )
+    return thread_id
+
+
+def _shard_engine(app_main, thread_id):
+    return app_main.chat_store.engines[app_main.chat_store.shard_for(thread_id)]
+
+
+def _messages(client, thread_id, **params):
+    response = client.get(f"/chat/threads/{thread_id}/messages", params=dict(params, username="alice"))
+    assert response.status_code == 200
+    return response.json()
+
+
+def _hot_ids(app_main, thread_id):
+    with _shard_engine(app_main, thread_id).connect() as connection:
+        return [row[0] for row in connection.execute(
+            text("SELECT id FROM chat_messages WHERE thread_id = :thread_id ORDER BY id"), {"thread_id": thread_id}
+        )]
+
+
+def test_compaction_packs_idle_read_threads_and_keeps_their_messages(app_main, client, idle_thread, open_thread, send_message):
+    unread = open_thread(title="Phone")
+    send_message(unread, "bob", "hello?")
+    before = _messages(client, idle_thread)
+
+    metrics = chat_cold_storage.compact_inactive_threads(_shard_engine(app_main, idle_thread))
+
+    assert metrics["threads_compacted"] == 1
+    assert metrics["messages_compacted"] == 4
+    assert _hot_ids(app_main, idle_thread) == []
+    assert len(_hot_ids(app_main, unread)) == 1
+    assert _messages(client, idle_thread) == before
+
+
+def test_compaction_commits_in_small_batches(app_main, client, open_thread, send_message, monkeypatch):
+    monkeypatch.setattr(chat_cold_storage, "COMPACT_BATCH_THREADS", 2)
+    thread_ids = [open_thread(title=f"Laptop {n}") for n in range(5)]
+    for thread_id in thread_ids:
+        send_message(thread_id, "bob", "hi")
+        assert client.post(f"/chat/threads/{thread_id}/read", params={"username": "alice"}).status_code == 200
+
+    metrics = chat_cold_storage.compact_inactive_threads(_shard_engine(app_main, thread_ids[0]), inactive_days=-1)
+
+    assert metrics["threads_compacted"] == 5
+    assert metrics["chunks"] == 3
+
+
+def test_messages_merge_cold_and_hot_parts_with_after_id(app_main, client, idle_thread):
+    engine = _shard_engine(app_main, idle_thread)
+    chat_cold_storage.compact_inactive_threads(engine)
+    cold = _messages(client, idle_thread)
+    # A message that arrived while the thread was being compacted stays hot.
+    with engine.begin() as connection:
+        connection.execute(
+            text(
+                "INSERT INTO chat_messages (id, thread_id, sender_username, content, created_at) "
+                "VALUES (:id, :thread_id, 'bob', 'late', :now)"
+            ),
+            {"id": cold[-1]["id"] + 1, "thread_id": idle_thread, "now": datetime.utcnow().isoformat(sep=" ")},
+        )
+
+    merged = _messages(client, idle_thread)
+    assert [m["content"] for m in merged] == [m["content"] for m in cold] + ["late"]
+    assert [m["content"] for m in _messages(client, idle_thread, after_id=cold[1]["id"])] == ["message 2", "message 3", "late"]
+    assert [m["content"] for m in _messages(client, idle_thread, after_id=cold[-1]["id"])] == ["late"]
+    assert _messages(client, idle_thread, after_id=cold[-1]["id"] + 1) == []
+
+
+def test_sending_to_a_cold_thread_moves_its_messages_back(app_main, client, idle_thread, send_message):
+    engine = _shard_engine(app_main, idle_thread)
+    chat_cold_storage.compact_inactive_threads(engine)
+    cold_ids = [m["id"] for m in _messages(client, idle_thread)]
+
+    sent = send_message(idle_thread, "bob", "still available?")
+
+    with engine.connect() as connection:
+        assert chat_cold_storage.cold_last_message_id(connection, idle_thread) is None
+    assert _hot_ids(app_main, idle_thread) == cold_ids + [sent["id"]]
+    assert [m["id"] for m in _messages(client, idle_thread)] == cold_ids + [sent["id"]]
+
+
+def test_cached_cold_thread_is_only_used_while_last_message_id_matches(app_main, client, idle_thread):
+    chat_cold_storage.compact_inactive_threads(_shard_engine(app_main, idle_thread))
+    messages = _messages(client, idle_thread)
+    last_id = messages[-1]["id"]
+    assert chat_cold_storage.cold_cache.get(idle_thread, last_id) == messages
+    assert chat_cold_storage.cold_cache.get(idle_thread, last_id + 1) is None
+
+    # An entry left by an older compaction (e.g. from before another worker re-compacted) is ignored.
+    chat_cold_storage.cold_cache.put(idle_thread, last_id - 1, [{"id": 1, "content": "stale"}])
+    assert _messages(client, idle_thread) == messages
+    assert chat_cold_storage.cold_cache.get(idle_thread, last_id) == messages
+
+
+def test_cold_thread_cache_evicts_least_recently_used():
+    cache = chat_cold_storage.ColdThreadCache(max_threads=2)
+    cache.put(1, 10, ["a"])
+    cache.put(2, 20, ["b"])
+    assert cache.get(1, 10) == ["a"]
+    cache.put(3, 30, ["c"])
+    assert cache.get(2, 20) is None
+    assert cache.get(1, 10) == ["a"]
+    assert len(cache) == 2
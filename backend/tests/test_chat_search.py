@@ -0,0 +1,123 @@
+from sqlalchemy import create_engine, text
+
+import chat_cold_storage
+import chat_search
+
+
+def _search(client, username, q, **params):
+    response = client.get("/chat/search", params=dict(params, username=username, q=q))
+    assert response.status_code == 200
+    return response.json()
+
+
+def _fts_rows(app_main, shard):
+    with app_main.chat_store.engines[shard].connect() as connection:
+        return connection.execute(text(f"SELECT count(*) FROM {chat_search.FTS_TABLE}")).scalar()
+
+
+def test_search_only_sees_the_users_threads(client, open_thread, send_message):
+    own = open_thread(owner="alice", participant="bob")
+    other = open_thread(owner="carol", participant="bob")
+    send_message(own, "bob", "hello, is it still available?")
+    send_message(other, "bob", "hello carol")
+
+    alice = _search(client, "alice", "hello")["items"]
+    assert [(item["thread_id"], item["other_username"]) for item in alice] == [(own, "bob")]
+    assert alice[0]["snippet"] == "<mark>hello</mark>, is it still available?"
+    assert {item["thread_id"] for item in _search(client, "bob", "hello")["items"]} == {own, other}
+    assert _search(client, "carol", "available")["items"] == []
+
+
+def test_last_word_matches_as_a_prefix_and_snippets_are_escaped(client, open_thread, send_message):
+    thread = open_thread()
+    send_message(thread, "bob", "<b>Café</b> charger " + " ".join(f"word{i}" for i in range(30)))
+
+    items = _search(client, "alice", "cafe char")["items"]
+    assert len(items) == 1
+    assert items[0]["snippet"].startswith("&lt;b&gt;<mark>Café</mark>&lt;/b&gt; <mark>charger</mark> word0")
+    assert items[0]["snippet"].endswith("…")
+
+
+def test_paging_with_before_id(client, open_thread, send_message):
+    thread = open_thread()
+    ids = [send_message(thread, "bob", f"ping {i}")["id"] for i in range(5)]
+
+    first = _search(client, "alice", "ping", limit=3)
+    assert [item["message_id"] for item in first["items"]] == ids[:1:-1]
+    rest = _search(client, "alice", "ping", limit=3, before_id=first["next_before_id"])
+    assert [item["message_id"] for item in rest["items"]] == ids[1::-1]
+    assert rest["next_before_id"] is None
+
+
+def test_cold_threads_stay_searchable_without_a_copy_of_their_messages(app_main, client, open_thread, send_message):
+    thread = open_thread()
+    sent = send_message(thread, "bob", "the thinkpad is ready")
+    shard = app_main.chat_store.shard_for(thread)
+    with app_main.chat_store.engines[shard].begin() as connection:
+        chat_cold_storage.compact_thread(connection, thread)
+        assert connection.execute(text("SELECT count(*) FROM chat_messages")).scalar() == 0
+
+    items = _search(client, "alice", "thinkpad")["items"]
+    assert [(item["message_id"], item["sender_username"]) for item in items] == [(sent["id"], "bob")]
+    assert items[0]["snippet"] == "the <mark>thinkpad</mark> is ready"
+    assert items[0]["created_at"] == sent["created_at"]
+
+
+def test_deleted_threads_leave_the_index(app_main, client, open_thread, send_message):
+    hot, cold = open_thread(), open_thread(title="Phone")
+    for thread in (hot, cold):
+        send_message(thread, "bob", "hello there")
+    with app_main.chat_store.engines[app_main.chat_store.shard_for(cold)].begin() as connection:
+        chat_cold_storage.compact_thread(connection, cold)
+    before = sum(_fts_rows(app_main, shard) for shard in range(app_main.chat_store.shard_count))
+
+    db = app_main.SessionLocal()
+    db.query(app_main.Listing).delete()
+    db.commit()
+    db.close()
+    app_main.chat_store.clean_orphaned_chat_data(app_main.engine)
+
+    assert before == 2
+    assert sum(_fts_rows(app_main, shard) for shard in range(app_main.chat_store.shard_count)) == 0
+    # A contentless delete with the wrong values would leave the message's tokens behind.
+    for engine in app_main.chat_store.engines:
+        with engine.connect() as connection:
+            for expression in ("hello", "there", f'thread_key : ("t{hot}" OR "t{cold}")'):
+                assert connection.execute(text(
+                    f"SELECT count(*) FROM {chat_search.FTS_TABLE} WHERE {chat_search.FTS_TABLE} MATCH :expression"
+                ), {"expression": expression}).scalar() == 0
+
+
+def test_legacy_fts_table_is_rebuilt_contentless(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'chat-0.db'}")
+    with engine.begin() as connection:
+        connection.execute(text(
+            f"CREATE VIRTUAL TABLE {chat_search.FTS_TABLE} USING fts5("
+            " content, thread_id UNINDEXED, sender_username UNINDEXED, created_at UNINDEXED)"
+        ))
+        connection.execute(text(
+            "CREATE TABLE chat_messages (id INTEGER PRIMARY KEY, thread_id INTEGER,"
+            " sender_username TEXT, content TEXT, created_at TEXT)"
+        ))
+        connection.execute(text(
+            "INSERT INTO chat_messages VALUES (7, 3, 'bob', 'hello legacy', '2026-01-01 10:00:00')"
+        ))
+        connection.execute(text(
+            f"INSERT INTO {chat_search.FTS_TABLE} (rowid, content, thread_id, sender_username, created_at) "
+            "VALUES (7, 'hello legacy', 3, 'bob', '2026-01-01T10:00:00')"
+        ))
+    chat_cold_storage.ensure_cold_storage_table(engine)
+
+    chat_search.ensure_chat_search_tables(engine)
+
+    with engine.connect() as connection:
+        schema = connection.execute(text(
+            "SELECT sql FROM sqlite_master WHERE name = :name"), {"name": chat_search.FTS_TABLE}
+        ).scalar()
+        assert "thread_key" in schema and "content = ''" in schema
+        results = chat_search.search_messages(connection, [3], "legacy", None, 10)
+        assert chat_search.search_messages(connection, [4], "legacy", None, 10) == []
+    assert [(r["message_id"], r["created_at"], r["snippet"]) for r in results] == [
+        (7, "2026-01-01T10:00:00", "hello <mark>legacy</mark>")
+    ]
+    engine.dispose()
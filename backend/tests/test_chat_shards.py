@@ -0,0 +1,72 @@
+import sqlite3
+
+from sqlalchemy import Column, Integer, MetaData, String, Table, create_engine, text
+
+import change_feed
+import chat_shards
+
+
+def _metadata():
+    metadata = MetaData()
+    Table(
+        "chat_threads", metadata,
+        Column("id", Integer, primary_key=True), Column("owner_username", String),
+        Column("participant_username", String),
+    )
+    Table(
+        "chat_messages", metadata,
+        Column("id", Integer, primary_key=True), Column("thread_id", Integer), Column("content", String),
+    )
+    Table(
+        "chat_read_states", metadata,
+        Column("id", Integer, primary_key=True), Column("thread_id", Integer), Column("username", String),
+    )
+    return metadata
+
+
+def test_new_shards_use_incremental_auto_vacuum(tmp_path):
+    store = chat_shards.ChatShardStore(_metadata(), shard_count=2, directory=str(tmp_path))
+    for shard in range(2):
+        connection = sqlite3.connect(store.path(shard))
+        assert connection.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+        assert connection.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        connection.close()
+    for engine in store.engines:
+        engine.dispose()
+
+
+def test_orphan_cleanup_writes_thread_tombstones(tmp_path):
+    store = chat_shards.ChatShardStore(_metadata(), shard_count=2, directory=str(tmp_path / "shards"))
+    main_engine = create_engine(f"sqlite:///{tmp_path / 'main.db'}")
+    change_feed.ensure_change_tracking(main_engine, [])
+    with main_engine.begin() as connection:
+        connection.execute(text("CREATE TABLE listings (id INTEGER PRIMARY KEY)"))
+        connection.execute(text(
+            "CREATE TABLE chat_thread_routes (id INTEGER PRIMARY KEY, listing_id INTEGER,"
+            " owner_username TEXT, participant_username TEXT, shard INTEGER)"
+        ))
+        connection.execute(text(
+            "CREATE TABLE chat_thread_tombstones (id INTEGER PRIMARY KEY, thread_id INTEGER,"
+            " owner_username TEXT, participant_username TEXT, change_seq INTEGER, deleted_at TIMESTAMP)"
+        ))
+        connection.execute(text("INSERT INTO listings (id) VALUES (1)"))
+        for thread_id, listing_id in ((10, 1), (11, 2), (12, 2)):
+            connection.execute(text(
+                "INSERT INTO chat_thread_routes VALUES (:id, :listing, 'alice', 'bob', :shard)"
+            ), {"id": thread_id, "listing": listing_id, "shard": store.shard_for(thread_id)})
+            with store.engines[store.shard_for(thread_id)].begin() as chat_connection:
+                chat_connection.execute(text(
+                    "INSERT INTO chat_threads (id, owner_username, participant_username) VALUES (:id, 'alice', 'bob')"
+                ), {"id": thread_id})
+        before = change_feed.current_change_seq(connection)
+
+    assert store.clean_orphaned_chat_data(main_engine)["threads_deleted"] == 2
+    with main_engine.connect() as connection:
+        tombstones = connection.execute(text(
+            "SELECT thread_id, owner_username, participant_username, change_seq FROM chat_thread_tombstones ORDER BY thread_id"
+        )).fetchall()
+    assert [row[:3] for row in tombstones] == [(11, "alice", "bob"), (12, "alice", "bob")]
+    assert all(row[3] > before for row in tombstones) and tombstones[0][3] != tombstones[1][3]
+    for engine in store.engines:
+        engine.dispose()
+    main_engine.dispose()
@@ -0,0 +1,91 @@
+def _changes(client, since, **params):
+    response = client.get("/listings", params=dict(params, since=since))
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_since_pages_through_items_and_tombstones_in_change_order(client, create_listing):
+    kept = [create_listing(title=f"Laptop {n}") for n in range(3)]
+    deleted = create_listing(owner="bob", title="Old phone")
+    assert client.delete(f"/listings/{deleted}", params={"username": "bob"}).status_code == 200
+    kept.append(create_listing(owner="carol", title="Tablet"))
+
+    since, items, tombstones, marks = 0, [], [], []
+    while True:
+        page = _changes(client, since, per_page=2)
+        assert len(page["items"]) + len(page["tombstones"]) <= 2
+        items += [item["id"] for item in page["items"]]
+        tombstones += page["tombstones"]
+        marks.append(page["high_water_mark"])
+        since = page["high_water_mark"]
+        if not page["has_more"]:
+            break
+
+    assert len(marks) == 3
+    assert marks == sorted(set(marks))
+    assert items == kept
+    assert tombstones == [deleted]
+    assert _changes(client, since) == {"items": [], "tombstones": [], "high_water_mark": since, "has_more": False}
+
+
+def test_completed_deleted_and_rejected_listings_come_back_as_tombstones(client, create_listing):
+    completed, deleted, rejected, untouched = (create_listing(title=f"Laptop {n}") for n in range(4))
+    since = _changes(client, 0)["high_water_mark"]
+
+    response = client.post(
+        f"/listings/{completed}/complete", params={"username": "alice"}, json={"recipient_username": "bob"},
+    )
+    assert response.status_code == 200
+    assert client.delete(f"/listings/{deleted}", params={"username": "alice"}).status_code == 200
+    response = client.post(
+        "/admin/approve-listing", params={"admin_username": "admin"},
+        json={"listing_id": rejected, "approved": False},
+    )
+    assert response.status_code == 200
+
+    changes = _changes(client, since)
+    assert changes["items"] == []
+    assert changes["tombstones"] == sorted([completed, deleted, rejected])
+    assert untouched not in changes["tombstones"]
+
+
+def test_own_listing_changes_leave_out_other_owners(client, create_listing):
+    since = _changes(client, 0, own_username="alice")["high_water_mark"]
+    mine = create_listing(title="Laptop", approve=False)
+    theirs = create_listing(owner="bob", title="Phone", approve=False)
+    gone = create_listing(owner="bob", title="Tablet")
+    assert client.delete(f"/listings/{gone}", params={"username": "bob"}).status_code == 200
+
+    changes = _changes(client, since, own_username="alice")
+    assert [item["id"] for item in changes["items"]] == [mine]
+    assert changes["tombstones"] == []
+
+    bob_changes = _changes(client, since, own_username="bob")
+    assert [item["id"] for item in bob_changes["items"]] == [theirs]
+    assert bob_changes["tombstones"] == [gone]
+
+
+def test_since_zero_returns_the_same_listings_as_a_full_fetch(client, create_listing):
+    for n in range(3):
+        create_listing(title=f"Laptop {n}")
+    create_listing(owner="bob", title="Pending phone", approve=False)
+
+    full = client.get("/listings", params={"per_page": 200}).json()
+    changes = _changes(client, 0, per_page=200)
+    assert sorted(item["id"] for item in changes["items"]) == sorted(item["id"] for item in full["items"])
+    assert changes["has_more"] is False
+    assert changes["high_water_mark"] == full["meta"]["high_water_mark"]
+
+
+def test_chat_feed_picks_up_a_message_from_the_other_participant(client, open_thread, send_message):
+    thread_id = open_thread()
+    initial = client.get("/chat/threads", params={"username": "alice", "since": 0}).json()
+    assert [thread["id"] for thread in initial["items"]] == [thread_id]
+    assert initial["items"] == client.get("/chat/threads", params={"username": "alice"}).json()
+
+    send_message(thread_id, "bob", "Is it still available?")
+    changes = client.get("/chat/threads", params={"username": "alice", "since": initial["high_water_mark"]}).json()
+    assert [thread["id"] for thread in changes["items"]] == [thread_id]
+    assert changes["items"][0]["unread_count"] == 1
+    assert changes["tombstones"] == []
+    assert changes["high_water_mark"] >= initial["high_water_mark"]
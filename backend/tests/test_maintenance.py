@@ -0,0 +1,105 @@
+import asyncio
+import time
+
+from sqlalchemy import create_engine, text
+
+import maintenance
+
+
+def _scheduler(tmp_path, jobs):
+    engine = create_engine(f"sqlite:///{tmp_path / 'maintenance.db'}")
+    maintenance.ensure_maintenance_tables(engine)
+    return maintenance.MaintenanceScheduler(engine, jobs=jobs)
+
+
+def test_tick_stops_when_the_lease_is_lost_between_jobs(tmp_path):
+    ran = []
+
+    def steal_lease(engine):
+        ran.append("steal_lease")
+        with engine.begin() as connection:
+            connection.execute(text("UPDATE scheduler_leases SET holder = 'other-worker'"))
+        return {}
+
+    def second(engine):
+        ran.append("second")
+        return {}
+
+    scheduler = _scheduler(tmp_path, [("steal_lease", steal_lease, 60), ("second", second, 60)])
+    asyncio.run(scheduler._tick())
+
+    assert ran == ["steal_lease"]
+    assert not scheduler.is_leader
+
+
+def test_lease_is_renewed_while_a_long_job_runs(tmp_path, monkeypatch):
+    monkeypatch.setattr(maintenance, "LEASE_TTL_SECONDS", 0.3)
+    renewals = []
+
+    def slow(engine):
+        time.sleep(0.5)
+        return {}
+
+    scheduler = _scheduler(tmp_path, [("slow", slow, 60)])
+    acquire = scheduler._acquire_lease
+
+    def counting_acquire():
+        renewals.append(True)
+        return acquire()
+
+    scheduler._acquire_lease = counting_acquire
+    asyncio.run(scheduler._tick())
+
+    # One at the start of the tick, one before the job, then heartbeats every TTL / 3.
+    assert len(renewals) >= 4
+    assert scheduler.is_leader
+
+
+def test_restarted_scheduler_waits_for_the_interval_from_the_last_recorded_run(tmp_path):
+    ran = []
+    jobs = [("hourly", lambda engine: ran.append("hourly") or {}, 60 * 60)]
+    first = _scheduler(tmp_path, jobs)
+    asyncio.run(first._tick())
+    first._release_lease()
+
+    restarted = _scheduler(tmp_path, jobs)
+    asyncio.run(restarted._tick())
+    assert restarted.is_leader
+    assert ran == ["hourly"]
+
+    with restarted.engine.begin() as connection:
+        connection.execute(text("UPDATE maintenance_runs SET started_at = datetime(started_at, '-61 minutes')"))
+    asyncio.run(restarted._tick())
+    assert ran == ["hourly", "hourly"]
+
+
+def test_history_pruning_keeps_the_latest_run_of_every_job(tmp_path, monkeypatch):
+    monkeypatch.setattr(maintenance, "RUN_HISTORY_LIMIT", 3)
+    scheduler = _scheduler(tmp_path, [("daily", lambda engine: {}, 24 * 60 * 60), ("often", lambda engine: {}, 60)])
+    daily, often = scheduler.jobs
+    scheduler.run_job(daily)
+    for _ in range(10):
+        scheduler.run_job(often)
+
+    assert set(maintenance.last_run_times(scheduler.engine)) == {"daily", "often"}
+    assert len(maintenance.recent_runs(scheduler.engine, 50)) == 4
+
+
+def test_incremental_vacuum_releases_every_free_page_in_batches(tmp_path, monkeypatch):
+    monkeypatch.setattr(maintenance, "INCREMENTAL_VACUUM_PAGES", 10)
+    monkeypatch.setattr(maintenance, "CHUNK_PAUSE_SECONDS", 0)
+    path = tmp_path / "vacuum.db"
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as connection:
+        connection.execute(text("PRAGMA auto_vacuum=INCREMENTAL"))
+        connection.execute(text("CREATE TABLE blobs (id INTEGER PRIMARY KEY, body BLOB)"))
+        connection.execute(text("INSERT INTO blobs (body) VALUES (zeroblob(4000))"), [{}] * 50)
+        connection.execute(text("DELETE FROM blobs"))
+    size_before = path.stat().st_size
+
+    released = maintenance.incremental_vacuum(engine)
+    with engine.connect() as connection:
+        assert connection.execute(text("PRAGMA freelist_count")).scalar() == 0
+    assert released >= 50
+    assert path.stat().st_size < size_before
+    engine.dispose()
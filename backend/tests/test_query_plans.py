@@ -0,0 +1,9 @@
+import check_query_plans
+
+
+def test_every_endpoint_passes_the_query_plan_check(tmp_path, monkeypatch, capsys):
+    # main.py opens ./devicelink.db, so the check has to run in a scratch directory.
+    monkeypatch.chdir(tmp_path)
+    failures = check_query_plans.run(workdir=str(tmp_path))
+    report = capsys.readouterr().out
+    assert failures == 0, report
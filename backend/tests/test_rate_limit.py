@@ -0,0 +1,29 @@
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+from rate_limit import InMemoryBackend, RateLimit, RateLimiter
+
+
+def _client():
+    limiter = RateLimiter(limits={"browse": RateLimit(rate=0.001, capacity=2)}, backend=InMemoryBackend())
+    app = FastAPI()
+
+    @app.get("/items", dependencies=[Depends(limiter.dependency("browse"))])
+    def items():
+        return []
+
+    return TestClient(app)
+
+
+def test_limit_is_keyed_on_the_client_not_the_username_parameter():
+    client = _client()
+    statuses = [client.get("/items", params={"username": f"made-up-{i}"}).status_code for i in range(3)]
+    assert statuses == [200, 200, 429]
+
+
+def test_a_username_parameter_cannot_drain_another_clients_bucket():
+    client = _client()
+    for _ in range(3):
+        client.get("/items", params={"username": "victim"})
+    other = TestClient(client.app, client=("198.51.100.7", 50000))
+    assert other.get("/items", params={"username": "victim"}).status_code == 200
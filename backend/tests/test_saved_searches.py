@@ -0,0 +1,78 @@
+from saved_search_index import SavedSearchEntry, SavedSearchIndex
+
+
+def _index(*entries):
+    index = SavedSearchIndex()
+    index.rebuild(entries)
+    return index
+
+
+def _ids(entries):
+    return sorted(entry.id for entry in entries)
+
+
+def test_facet_only_searches_match_on_category_and_condition():
+    index = _index(
+        SavedSearchEntry(id=1, username="a", keywords=frozenset(), category="Laptop"),
+        SavedSearchEntry(id=2, username="a", keywords=frozenset(), category="Laptop", condition="New"),
+        SavedSearchEntry(id=3, username="a", keywords=frozenset(), condition="Good"),
+        SavedSearchEntry(id=4, username="a", keywords=frozenset(), category="Phone"),
+    )
+    assert _ids(index.match("Dell", "", "Laptop", "Good", 1)) == [1, 3]
+    assert _ids(index.match("Dell", "", "Laptop", "New", 1)) == [1, 2]
+
+
+def test_quantity_range_is_inclusive_and_rejects_missing_quantity():
+    index = _index(
+        SavedSearchEntry(id=1, username="a", keywords=frozenset({"dell"}), min_quantity=2, max_quantity=4),
+        SavedSearchEntry(id=2, username="a", keywords=frozenset({"dell"}), min_quantity=5),
+        SavedSearchEntry(id=3, username="a", keywords=frozenset({"dell"}), max_quantity=1),
+    )
+    assert _ids(index.match("Dell", "", "Laptop", "Good", 2)) == [1]
+    assert _ids(index.match("Dell", "", "Laptop", "Good", 4)) == [1]
+    assert _ids(index.match("Dell", "", "Laptop", "Good", 5)) == [2]
+    assert _ids(index.match("Dell", "", "Laptop", "Good", 1)) == [3]
+    assert _ids(index.match("Dell", "", "Laptop", "Good", None)) == []
+
+
+def test_keywords_must_all_appear_in_title_or_description():
+    index = _index(SavedSearchEntry(id=1, username="a", keywords=frozenset({"dell", "charger"})))
+    assert _ids(index.match("Dell laptop", "comes with charger", None, None, 1)) == [1]
+    assert _ids(index.match("Dell laptop", "no extras", None, None, 1)) == []
+    index.remove(1)
+    assert index.match("Dell laptop", "comes with charger", None, None, 1) == []
+
+
+def test_search_without_criteria_is_rejected(client):
+    for body in ({}, {"keywords": "  "}, {"keywords": "!!"}):
+        response = client.post("/saved-searches", params={"username": "bob"}, json=body)
+        assert response.status_code == 400
+    assert client.get("/saved-searches", params={"username": "bob"}).json() == []
+
+
+def test_approved_listing_reaches_matching_inboxes_except_the_owner(client, create_listing):
+    for username in ("alice", "bob"):
+        response = client.post("/saved-searches", params={"username": username}, json={"keywords": "dell"})
+        assert response.status_code == 200
+    client.post("/saved-searches", params={"username": "carol"}, json={"category": "Phone"})
+
+    listing_id = create_listing(owner="alice", title="Dell laptop")
+
+    inbox = lambda username: client.get("/saved-searches/inbox", params={"username": username}).json()["items"]
+    assert [item["listing_id"] for item in inbox("bob")] == [listing_id]
+    assert inbox("alice") == []
+    assert inbox("carol") == []
+
+
+def test_reapproving_a_rejected_listing_notifies_once(client, create_listing):
+    client.post("/saved-searches", params={"username": "bob"}, json={"keywords": "dell"})
+    listing_id = create_listing(owner="alice", title="Dell laptop")
+    for approved in (False, True, True):
+        response = client.post(
+            "/admin/approve-listing", params={"admin_username": "admin"},
+            json={"listing_id": listing_id, "approved": approved},
+        )
+        assert response.status_code == 200
+
+    items = client.get("/saved-searches/inbox", params={"username": "bob"}).json()["items"]
+    assert [item["listing_id"] for item in items] == [listing_id]
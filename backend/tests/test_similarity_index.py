@@ -0,0 +1,134 @@
+import random
+from collections import Counter
+
+import numpy as np
+
+from similarity_index import ListingSimilarityIndex
+
+VOCABULARY = [f"w{i}" for i in range(40)] + ["category:laptop", "category:phone", "condition:good"]
+
+
+def _document(rng):
+    return rng.choices(VOCABULARY, k=rng.randint(3, 8))
+
+
+def _index(**options):
+    # No background rebuilds: every change has to be applied incrementally.
+    options.setdefault("top_k", 3)
+    return ListingSimilarityIndex(rebuild_ratio=100, oov_min_tokens=10 ** 9, **options)
+
+
+def _expected(index, docs):
+    """Neighbours from scratch over `docs`, with the vocabulary and IDF of the index's last build."""
+    ids = sorted(docs)
+    matrix = index._vectorize([Counter(docs[i]) for i in ids], index._vocab, index._idf)
+    neighbors = index._top_k_rows(matrix, np.ones(len(ids), dtype=bool), ids, range(len(ids)))
+    return _rounded(neighbors)
+
+
+def _rounded(neighbors):
+    return {
+        listing_id: [(round(score, 9), other) for score, other in neighbor_list]
+        for listing_id, neighbor_list in neighbors.items()
+    }
+
+
+def _assert_consistent(index, docs):
+    assert _rounded(index._neighbors) == _expected(index, docs)
+    referenced = {}
+    for listing_id, neighbor_list in index._neighbors.items():
+        for _, other in neighbor_list:
+            referenced.setdefault(other, set()).add(listing_id)
+    assert {k: v for k, v in index._referenced_by.items() if v} == referenced
+
+
+def test_full_build_matches_compute():
+    rng = random.Random(1)
+    docs = {i: _document(rng) for i in range(60)}
+    index = _index()
+    index.load(docs.items())
+    *_, neighbors = index._compute(docs)
+    assert _rounded(index._neighbors) == _rounded(neighbors)
+
+
+def test_incremental_adds_update_existing_neighbour_lists():
+    rng = random.Random(2)
+    docs = {i: _document(rng) for i in range(40)}
+    index = _index()
+    index.load(docs.items())
+    for i in range(40, 70):
+        docs[i] = _document(rng)
+        index.upsert(i, docs[i])
+    _assert_consistent(index, docs)
+
+
+def test_removals_recompute_the_lists_that_referenced_them():
+    rng = random.Random(3)
+    docs = {i: _document(rng) for i in range(60)}
+    index = _index()
+    index.load(docs.items())
+    # Remove the most referenced listings first so plenty of lists need recomputing.
+    victims = sorted(index._referenced_by, key=lambda i: -len(index._referenced_by[i]))[:15]
+    for listing_id in victims:
+        del docs[listing_id]
+        index.remove(listing_id)
+        assert index.similar(listing_id) == []
+    _assert_consistent(index, docs)
+    assert not set(victims) & {other for lst in index._neighbors.values() for _, other in lst}
+
+
+def test_upsert_of_an_indexed_listing_replaces_its_vector():
+    rng = random.Random(4)
+    docs = {i: _document(rng) for i in range(40)}
+    index = _index()
+    index.load(docs.items())
+    for listing_id in (3, 17, 25):
+        docs[listing_id] = _document(rng)
+        index.upsert(listing_id, docs[listing_id])
+    _assert_consistent(index, docs)
+
+
+def test_changes_made_during_a_rebuild_are_replayed():
+    rng = random.Random(5)
+    docs = {i: _document(rng) for i in range(40)}
+    index = _index()
+    index.load(docs.items())
+    compute = index._compute
+
+    def compute_while_changing(snapshot):
+        state = compute(snapshot)
+        for listing_id in (40, 41, 42):
+            docs[listing_id] = _document(rng)
+            index.upsert(listing_id, docs[listing_id])
+        for listing_id in (1, 2):
+            del docs[listing_id]
+            index.remove(listing_id)
+        docs[5] = _document(rng)
+        index.upsert(5, docs[5])
+        return state
+
+    index._compute = compute_while_changing
+    index.rebuild()
+    index._compute = compute
+    assert sorted(index._rows) == sorted(docs)
+    _assert_consistent(index, docs)
+
+
+def test_changes_before_the_first_load_win_over_the_loaded_rows():
+    rng = random.Random(6)
+    docs = {i: _document(rng) for i in range(30)}
+    index = _index()
+    index.remove(7)
+    fresh = _document(rng)
+    index.upsert(8, fresh)
+    assert not index.ready
+
+    index.load(docs.items())
+    del docs[7]
+    docs[8] = fresh
+    assert 7 not in index._rows and index.similar(7) == []
+    assert index._docs[8] is fresh
+    _assert_consistent(index, docs)
+    # Tombstones only cover the first load.
+    index.upsert(7, _document(rng))
+    assert 7 in index._rows
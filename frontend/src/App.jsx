@@ -125,15 +125,6 @@ function App() {
       if (endpoint === 'login') {
         setIsLoggedIn(true);
         setCurrentPage('dashboard');
-        try {
-          const adminRes = await fetch(`${API_BASE}/admin/check/${formData.username}`);
-          if (adminRes.ok) {
-            const adminData = await adminRes.json();
-            setIsAdmin(adminData.is_admin);
-          }
-        } catch {
-          console.log('Could not check admin status');
-        }
       } else {
         alert('Success! Please login.');
         setAuthView('login');
@@ -185,48 +176,50 @@ function App() {
     try {
       const res = await fetch(`${API_BASE}/chat/threads?username=${encodeURIComponent(formData.username)}`);
       if (!res.ok) return;
-      const data = await res.json();
+      applyChatThreads(await res.json(), showNotifications);
+    } catch (err) {
+      console.error('Failed to fetch chat threads:', err);
+    }
+  };
 
-      const nextUnreadByThread = {};
-      data.forEach((thread) => {
-        nextUnreadByThread[thread.id] = thread.unread_count || 0;
-      });
+  const applyChatThreads = (data, showNotifications) => {
+    const nextUnreadByThread = {};
+    data.forEach((thread) => {
+      nextUnreadByThread[thread.id] = thread.unread_count || 0;
+    });
 
-      if (showNotifications && unreadInitializedRef.current) {
-        data.forEach((thread) => {
-          const previousUnread = unreadByThreadRef.current[thread.id] || 0;
-          const currentUnread = thread.unread_count || 0;
-          if (currentUnread > previousUnread) {
-            const isActiveThread = currentPage === 'chat' && activeThreadRef.current?.id === thread.id;
-            if (!isActiveThread) {
-              const counterpart = thread.owner_username === formData.username
-                ? thread.participant_username
-                : thread.owner_username;
-              const delta = currentUnread - previousUnread;
-              addToastNotification(
-                delta === 1
-                  ? `New message from ${counterpart}`
-                  : `${delta} new messages from ${counterpart}`
-              );
-            }
+    if (showNotifications && unreadInitializedRef.current) {
+      data.forEach((thread) => {
+        const previousUnread = unreadByThreadRef.current[thread.id] || 0;
+        const currentUnread = thread.unread_count || 0;
+        if (currentUnread > previousUnread) {
+          const isActiveThread = currentPage === 'chat' && activeThreadRef.current?.id === thread.id;
+          if (!isActiveThread) {
+            const counterpart = thread.owner_username === formData.username
+              ? thread.participant_username
+              : thread.owner_username;
+            const delta = currentUnread - previousUnread;
+            addToastNotification(
+              delta === 1
+                ? `New message from ${counterpart}`
+                : `${delta} new messages from ${counterpart}`
+            );
           }
-        });
-      }
+        }
+      });
+    }
 
-      setChatThreads(data);
-      unreadByThreadRef.current = nextUnreadByThread;
-      unreadInitializedRef.current = true;
+    setChatThreads(data);
+    unreadByThreadRef.current = nextUnreadByThread;
+    unreadInitializedRef.current = true;
 
-      const currentActive = activeThreadRef.current;
-      if (currentActive) {
-        const stillExists = data.some((t) => t.id === currentActive.id);
-        if (!stillExists) {
-          setActiveThread(null);
-          setChatMessages([]);
-        }
+    const currentActive = activeThreadRef.current;
+    if (currentActive) {
+      const stillExists = data.some((t) => t.id === currentActive.id);
+      if (!stillExists) {
+        setActiveThread(null);
+        setChatMessages([]);
       }
-    } catch (err) {
-      console.error('Failed to fetch chat threads:', err);
     }
   };
 
@@ -430,11 +423,26 @@ function App() {
     }
   };
 
+  const loadSession = async () => {
+    try {
+      const res = await fetch(`${API_BASE}/session/bootstrap?username=${encodeURIComponent(formData.username)}`);
+      if (!res.ok) return;
+      const data = await res.json();
+
+      setIsAdmin(data.admin.is_admin);
+      const ownListings = data.own_listings.items || [];
+      const publicListings = (data.listings.items || []).filter((l) => l.owner !== formData.username);
+      setListings([...ownListings, ...publicListings]);
+      setDonationHistory(data.donation_history);
+      applyChatThreads(data.chat_threads.items, false);
+    } catch (err) {
+      console.error('Failed to load session:', err);
+    }
+  };
+
   useEffect(() => {
     if (!isLoggedIn) return;
-    fetchListings();
-    fetchDonationHistory();
-    fetchChatThreads(false);
+    loadSession();
   }, [isLoggedIn]);
 
   useEffect(() => {